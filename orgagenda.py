@@ -20,6 +20,11 @@ import OrgExtended.asettings as sets
 import OrgExtended.pymitter as evt
 import OrgExtended.orginsertselected as insSel
 import calendar
+import bisect
+import collections
+import itertools
+import array
+import threading
 
 import dateutil.rrule as dr
 import dateutil.parser as dp
@@ -246,49 +251,34 @@ def IsOnDate(n, date):
     if isinstance(date, datetime.datetime):
         date = date.date()
     today = datetime.date.today()
-    # 4 months of per day scheduling is the maximum
-    # we are willing to loop to avoid crazy slow loops.
-    kMaxLoops = sets.GetInt("agendaMaxScheduledIterations", 120)
     timestamps = n.get_timestamps(active=True,point=True,range=True)
     for t in timestamps:
         if t.repeating:
             if DatesEqual(t.start, date):
                 return t
-            next = EnsureDateTime(t.start)
-            loopcount = 0
-            while next <= EnsureDateTime(date) and loopcount <= kMaxLoops:
-                if DatesEqual(next, date):
-                    return next
-                next = t.next_repeat_from(next)
-                loopcount += 1
+            next = t.repeat_on(date)
+            if next:
+                return next
         else:
             if t.has_overlap(date):
                 return t
     if n.scheduled:
         if n.scheduled.repeating:
-            next = n.scheduled.start
-            loopcount = 0
-            while EnsureDateTime(next) <= EnsureDateTime(date) and loopcount <= kMaxLoops:
-                if DatesEqual(next, date):
-                    return next
-                next = n.scheduled.next_repeat_from(EnsureDateTime(next))
-                loopcount += 1
+            next = n.scheduled.repeat_on(date)
+            if next:
+                return next
         else:
             schedule_start = EnsureDateTime(n.scheduled.start)
             if DatesEqual(date, schedule_start) or (schedule_start.date() < today and DatesEqual(date, today)):
                 return today
     if n.deadline:
-        start = EnsureDateTime(display_deadline_start(n.deadline))
+        start = EnsureDate(display_deadline_start(n.deadline))
         if start <= date:
             return n.deadline
         if n.deadline.repeating:
-            next = n.deadline.start
-            loopcount = 0
-            while(EnsureDateTime(next) <= EnsureDateTime(date) and loopcount <= kMaxLoops):
-                if DatesEqual(next, date):
-                    return next
-                next = n.deadline.next_repeat_from(EnsureDateTime(next))
-                loopcount += 1
+            next = n.deadline.repeat_on(date)
+            if next:
+                return next
     return None
 
 def IsAllDay(n, today):
@@ -371,6 +361,45 @@ def IsInHour(n, hour, today):
     return None
 
 
+def HoursInBracket(s, e):
+    if not e:
+        e = s + datetime.timedelta(minutes=30)
+    # The hours IsInHourBracket is true for.
+    return range((s.hour*60 + s.minute)//60, (e.hour*60 + e.minute + 59)//60)
+
+def InHours(n, today):
+    """
+    What IsInHour(n, hour, today) returns for every hour of the day,
+    as a dict from hour to timestamp without the hours it is None for.
+    Works everything out in one go instead of once per hour.
+    """
+    hours = {}
+    if not n:
+        return hours
+    def add(hrs, ts):
+        for h in hrs:
+            if h not in hours:
+                hours[h] = ts
+    timestamps = n.get_timestamps(active=True, point=True,range=True)
+    if timestamps:
+        for t in timestamps:
+            if t.has_time():
+                if t.repeating:
+                    next = t.next_repeat_from(today)
+                    add((next.hour,), next)
+                else:
+                    add(HoursInBracket(t.start, t.end), t)
+    if n.scheduled and n.scheduled.has_time():
+        if(n.scheduled.repeating):
+            # IsInHour gives up on any other hour right here.
+            next = n.scheduled.next_repeat_from(today)
+            add((next.hour,), next)
+            return hours
+        add(HoursInBracket(EnsureDateTime(n.scheduled.start), EnsureDateTime(n.scheduled.end)), n.scheduled)
+    if n.deadline:
+        add(HoursInBracket(EnsureDateTime(n.deadline.start), EnsureDateTime(n.deadline.end)), n.deadline)
+    return hours
+
 def Overlaps(s,e,rs,re):
     return not (s >= re or e <= rs)
 
@@ -418,6 +447,42 @@ def IsInHourAndMinute(n, hour, mstart, mend, today):
     return None
 
 
+def SlotsInBracket(s, e):
+    if not e:
+        e = s + datetime.timedelta(minutes=30)
+    # The 12 minute slots IsInHourAndMinuteBracket is true for.
+    return range((s.hour*60 + s.minute)//12, (e.hour*60 + e.minute + 11)//12)
+
+def InMinuteSlots(n, today):
+    """
+    What IsInHourAndMinute returns for every 12 minute slot of the day,
+    as a dict from slot (5 to the hour, hour*5 + minute//12) to timestamp.
+    """
+    slots = {}
+    if(not n):
+        return slots
+    def add(sl, ts):
+        for i in sl:
+            if i not in slots:
+                slots[i] = ts
+    timestamps = n.get_timestamps(active=True, point=True,range=True)
+    if(timestamps):
+        for t in timestamps:
+            if(t.has_time()):
+                if(t.repeating):
+                    next = t.next_repeat_from(today)
+                    add(range(next.hour*5, next.hour*5 + 5), next)
+                else:
+                    add(SlotsInBracket(t.start, t.end), t)
+    if(n.scheduled and n.scheduled.has_time()):
+        if(n.scheduled.repeating):
+            next = n.scheduled.next_repeat_from(today)
+            add(range(next.hour*5, next.hour*5 + 5), next)
+        add(SlotsInBracket(n.scheduled.start, n.scheduled.end), n.scheduled)
+    if(n.deadline):
+        add(SlotsInBracket(EnsureDateTime(n.deadline.start), EnsureDateTime(n.deadline.end)), n.deadline)
+    return slots
+
 def distanceFromStart(e, hour, minSlot):
     ts = e['ts']
     if(IsRawDate(ts)):
@@ -432,6 +497,214 @@ def display_deadline_start(deadline_date):
         prewarn_duration = deadline_date.warn_rule
     return deadline_date.start - prewarn_duration
 
+# ================================================================================
+# Filtered entries of recently shown agenda views, so flipping between
+# days and opening an agenda again does not filter every node of every
+# file again. A result is only good as is while the db has the same
+# files and none of them changed, any of them could have a node that
+# shows up now. Otherwise only the files that changed are filtered
+# again, see AgendaBaseView.LoadAndFilterEntries.
+#
+# The agenda precompute thread filters into this too, against a
+# snapshot of the sources taken on the main thread, hence the lock.
+AGENDA_CACHE_SIZE = 32
+
+# The settings that change which nodes an agenda shows, with their
+# defaults. Changing one of them makes for another cache key.
+AGENDA_FILTER_SETTINGS = [
+    ("agendaIncludeFilesOutsideOrgDir", False),
+    ("agendaProjectIs", "nested_todo"),
+    ("todoStates", sets.defaultTodoStates),
+]
+
+def AgendaFilterSettings():
+    return tuple(repr(sets.Get(name, default)) for (name, default) in AGENDA_FILTER_SETTINGS)
+
+def AgendaSources():
+    return [(f, f.org.env, f.org.env.generation) for f in db.Get().Files]
+
+class AgendaCache:
+    def __init__(self):
+        self.results = collections.OrderedDict()
+        self.lock    = threading.Lock()
+
+    # Whether sources still are the files of the db as they are now,
+    # or as they were in current when given.
+    def IsCurrent(self, sources, current=None):
+        if(current is None):
+            current = AgendaSources()
+        if(len(current) != len(sources)):
+            return False
+        for (f, e, g), (file, env, generation) in zip(current, sources):
+            if(f is not file or e is not env or g != generation):
+                return False
+        return True
+
+    # The files in sources that have not changed in current.
+    def UnchangedFiles(self, sources, current):
+        now = dict((id(file), (env, generation)) for (file, env, generation) in current)
+        unchanged = set()
+        for (file, env, generation) in sources:
+            e, g = now.get(id(file), (None, None))
+            if(e is env and g == generation):
+                unchanged.add(file)
+        return unchanged
+
+    # Returns (sources, lists) for key, current or not.
+    def Get(self, key):
+        if(key is None):
+            return None
+        with self.lock:
+            if(key not in self.results):
+                return None
+            result = self.results.pop(key)
+            self.results[key] = result
+            return result
+
+    def Put(self, key, sources, lists):
+        if(key is None):
+            return
+        with self.lock:
+            self.results.pop(key, None)
+            self.results[key] = (sources, lists)
+            while(len(self.results) > AGENDA_CACHE_SIZE):
+                self.results.popitem(last=False)
+
+    def Clear(self):
+        with self.lock:
+            self.results.clear()
+
+agendaCache = AgendaCache()
+
+# ================================================================================
+# Agenda views render into self.view with one insert per line, on a big
+# agenda that is thousands of buffer edits. While a view renders
+# self.view is one of these instead, it keeps what is appended to the
+# end of the view and the regions added in memory and Commit writes
+# them out with a single insert (or replace) and one add_regions per key.
+#
+# Only appending, rowcol, text_point and add_regions are done in memory.
+# Anything else (the calendar draws itself with replaces and selections)
+# writes out what is pending first and then goes to the real view, so
+# the view always looks to the renderer like it would have without this.
+#
+# Composite views and the calendar hang on to the view they rendered
+# into, once closed the buffer just passes everything on.
+class RenderBuffer:
+    def __init__(self, view):
+        self.output  = view
+        self.edit    = None
+        self.active  = True
+        self.Sync()
+
+    # Start over at the end of what is in the real view.
+    def Sync(self):
+        self.replace = False
+        self.base    = self.output.size()
+        self.baseRow, self.baseCol = self.output.rowcol(self.base)
+        self.chunks  = []
+        self.length  = 0
+        # Start of every line after the first, relative to base
+        self.lines   = []
+        self.regions = collections.OrderedDict()
+
+    def IsPending(self):
+        return self.replace or self.chunks or self.regions
+
+    def Commit(self, edit=None):
+        if(edit):
+            self.edit = edit
+        if(not self.IsPending()):
+            return
+        text = "".join(self.chunks)
+        if(self.replace):
+            self.output.replace(self.edit, sublime.Region(0, self.output.size()), text)
+        elif(text):
+            self.output.insert(self.edit, self.base, text)
+        for key, (regions, args, kwargs) in self.regions.items():
+            self.output.add_regions(key, regions, *args, **kwargs)
+        self.Sync()
+
+    def Close(self, edit):
+        self.Commit(edit)
+        self.active = False
+
+    def size(self):
+        if(not self.active):
+            return self.output.size()
+        return self.base + self.length
+
+    def insert(self, edit, pt, text):
+        if(not self.active):
+            return self.output.insert(edit, pt, text)
+        self.edit = edit
+        if(pt != self.size()):
+            self.Commit()
+            rv = self.output.insert(edit, pt, text)
+            self.Sync()
+            return rv
+        start = self.length
+        i = text.find("\n")
+        while(i >= 0):
+            self.lines.append(start + i + 1)
+            i = text.find("\n", i + 1)
+        self.chunks.append(text)
+        self.length += len(text)
+        return len(text)
+
+    def erase(self, edit, region):
+        if(not self.active):
+            return self.output.erase(edit, region)
+        self.edit = edit
+        # Clearing the view before rendering is the common case,
+        # the render then replaces what was there.
+        if(not self.IsPending() and region.begin() == 0 and region.end() == self.size()):
+            self.replace = True
+            self.base    = 0
+            self.baseRow = 0
+            self.baseCol = 0
+            return
+        self.Commit()
+        self.output.erase(edit, region)
+        self.Sync()
+
+    def rowcol(self, pt):
+        if(not self.active or pt < self.base):
+            return self.output.rowcol(pt)
+        rel = min(pt, self.size()) - self.base
+        k = bisect.bisect_right(self.lines, rel)
+        if(k == 0):
+            return (self.baseRow, self.baseCol + rel)
+        return (self.baseRow + k, rel - self.lines[k-1])
+
+    def text_point(self, row, col):
+        if(not self.active or row < self.baseRow):
+            return self.output.text_point(row, col)
+        k = row - self.baseRow
+        if(k == 0):
+            return self.base - self.baseCol + col
+        if(k > len(self.lines)):
+            return self.size()
+        return self.base + self.lines[k-1] + col
+
+    def add_regions(self, key, regions, *args, **kwargs):
+        if(not self.active):
+            return self.output.add_regions(key, regions, *args, **kwargs)
+        self.regions.pop(key, None)
+        self.regions[key] = (regions, args, kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.output, name)
+        if(not self.active or not callable(attr)):
+            return attr
+        def PassThrough(*args, **kwargs):
+            self.Commit()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.Sync()
+        return PassThrough
+
 # ================================================================================
 # IDEA Make a base class that has all the functionality needed to
 #      render an agenda view. Then create an agenda folder with
@@ -471,6 +744,13 @@ class AgendaBaseView:
         self.nochildtasks = "nochildtasks" in kwargs
         self.hastodoancestor = "hastodoancestor" in kwargs
         self.notodoancestor = "notodoancestor" in kwargs
+        # Compiled from the filters above on first use
+        self._filter = None
+        # What the view was asked to show, for the agenda cache
+        self._kwargs = dict(kwargs)
+        # Nothing is rendered after this view, it is free to
+        # leave part of itself for later.
+        self.endsView = True
 
         if(setup):
             self.SetupView()
@@ -563,7 +843,7 @@ class AgendaBaseView:
             return
         self._inPriorityTags     = []
         self._oneofPriorityTags  = []
-        self._outPriorityTagsags    = []
+        self._outPriorityTags    = []
         tags = self._priorityFilter.split(' ')
         for tag in tags:
             tag = tag.strip()
@@ -751,6 +1031,121 @@ class AgendaBaseView:
         return True
 
 
+    # ----------------------------------------------
+    # The filters are compiled into a single predicate the first time
+    # entries get filtered. Only the filters that are set up are looked
+    # at, those on the heading first since they are cheap and usually
+    # throw out the most, the view's own FilterEntry after them and
+    # the ones that need the node body last.
+    def StateClause(self):
+        if(not self._stateFilter):
+            return None
+        ins   = [re.compile(elem) for elem in self._inStateTags]
+        outs  = [re.compile(elem) for elem in self._outStateTags]
+        oneof = [re.compile(elem) for elem in self._oneofStateTags]
+        def MatchStateName(t):
+            if(ins and not all(r.search(t) for r in ins)):
+                return False
+            if(any(r.search(t) for r in outs)):
+                return False
+            if(oneof and not any(r.search(t) for r in oneof)):
+                return False
+            return True
+        return MatchStateName
+
+    def TagClause(self):
+        if(not self._tagfilter):
+            return None
+        intags  = frozenset(self._intags)
+        outtags = frozenset(self._outtags)
+        oneof   = frozenset(self._oneoftags)
+        def MatchTagSet(tags):
+            return intags <= tags and outtags.isdisjoint(tags) and (not oneof or not oneof.isdisjoint(tags))
+        return MatchTagSet
+
+    def PriorityClause(self):
+        if(not self._priorityFilter):
+            return None
+        ins   = tuple(self._inPriorityTags)
+        outs  = tuple(self._outPriorityTags)
+        oneof = tuple(self._oneofPriorityTags)
+        def MatchPriorityName(p):
+            if(not all(elem in p for elem in ins)):
+                return False
+            if(any(elem in p for elem in outs)):
+                return False
+            if(oneof and not any(elem in p for elem in oneof)):
+                return False
+            return True
+        return MatchPriorityName
+
+    def HasClauses(self):
+        checks = [
+            (self.hasclock,        lambda n, f: n.clock),
+            (self.hasdeadline,     lambda n, f: n.deadline),
+            (self.hasclose,        lambda n, f: n.closed),
+            (self.hasschedule,     lambda n, f: n.scheduled),
+            (self.haschildtasks,   lambda n, f: HasChildTasks(n)),
+            (self.hastodoancestor, lambda n, f: HasTodoAncestor(n)),
+            (self.noclock,         lambda n, f: not n.clock),
+            (self.nodeadline,      lambda n, f: not n.deadline),
+            (self.noclose,         lambda n, f: not n.closed),
+            (self.noschedule,      lambda n, f: not n.scheduled),
+            (self.nochildtasks,    lambda n, f: not HasChildTasks(n)),
+            (self.notodoancestor,  lambda n, f: not HasTodoAncestor(n)),
+        ]
+        return [check for (on, check) in checks if on]
+
+    def CompileFilter(self):
+        clauses = []
+        self._stateMatch = self.StateClause()
+        self._tagMatch   = self.TagClause()
+        state    = self._stateMatch
+        tags     = self._tagMatch
+        priority = self.PriorityClause()
+        if(state):
+            clauses.append(lambda n, f: state(n.todo or ""))
+        if(tags):
+            clauses.append(lambda n, f: tags(n.tags))
+        if(priority):
+            clauses.append(lambda n, f: priority(n.priority or ""))
+        clauses += self.HasClauses()
+        clauses.append(self.FilterEntry)
+        if(self._startDoneDateComparator or self._endDoneDateComparator):
+            clauses.append(lambda n, f: self.MatchDate(n))
+        if(self._afterDuration or self._beforeDuration):
+            clauses.append(lambda n, f: self.MatchDuration(n))
+        if(self.clockedtoday or self.clockfilter):
+            clauses.append(lambda n, f: self.MatchClock(n))
+        def Match(n, f):
+            for clause in clauses:
+                if(not clause(n, f)):
+                    return False
+            return True
+        return Match
+
+    def Filter(self):
+        if(self._filter is None):
+            self._filter = self.CompileFilter()
+        return self._filter
+
+    # Indexes of the nodes in file the state and tag filters can
+    # match, looked up in the file's node index. None when those
+    # filters do not narrow anything down.
+    def IndexedNodes(self, file):
+        self.Filter()
+        tagged = self._tagMatch and (self._intags or self._oneoftags)
+        if(not self._stateMatch and not tagged):
+            return None
+        index = file.NodeIndex()
+        found = None
+        if(self._stateMatch):
+            found = index.WithState(self._stateMatch)
+        if(tagged):
+            nodes = index.WithTags(self._intags, self._oneoftags)
+            found = nodes if found is None else found & nodes
+        return found
+
     def SetupView(self):
         self.view = CreateUniqueViewNamed(self.name, self)
         self.view.set_read_only(True)
@@ -763,10 +1158,34 @@ class AgendaBaseView:
         self.view.agenda = self
 
     def DoRenderView(self,edit, clear = False):
+        self.Buffered(edit, self.RenderView, edit, clear)
+
+    # Runs render(*args) with the view writable and the output
+    # going through a RenderBuffer.
+    def Buffered(self, edit, render, *args):
         self.StartEditing()
-        self.RenderView(edit, clear)
+        view = self.view
+        self.view = RenderBuffer(view)
+        try:
+            render(*args)
+        finally:
+            self.view.Close(edit)
+            self.view = view
         self.DoneEditing()
 
+    # Views that render a page at a time, see TodoView.
+    def HasMore(self):
+        return False
+
+    def IsNearMore(self, row):
+        return False
+
+    def DoRenderMore(self, edit):
+        self.Buffered(edit, self.RenderMore, edit)
+
+    def RenderMore(self, edit):
+        pass
+
     def OpenFilterView(self):
         first = True
         for v in self.agendaViews:
@@ -838,35 +1257,115 @@ class AgendaBaseView:
     def RenderView(self, edit, clear=False):
         pass
 
-    def generate_entries(self):
+    # Views that only show what happens on some days return the first
+    # and last of those days, only the nodes that can show up on them
+    # are looked at then. None means every node is a candidate.
+    def DateRange(self):
+        return None
+
+    # Entries for every node of the db, or only of files when given.
+    def generate_entries(self, files=None):
         allowOutsideOrgDir = sets.Get("agendaIncludeFilesOutsideOrgDir", False)
-        for file in db.Get().Files:
+        dates = self.DateRange()
+        if(files is None):
+            files = db.Get().Files
+        for file in files:
             # Skip over files not in orgDir
             if not file.isOrgDir and not allowOutsideOrgDir:
                 continue
-            for n in file.org[1:]:
+            indexes = None
+            if(dates is not None):
+                indexes = file.DateIndex().Lookup(dates[0], dates[1])
+            found = self.IndexedNodes(file)
+            if(found is not None):
+                indexes = sorted(found) if indexes is None else [i for i in indexes if i in found]
+            nodes = file.org[1:] if indexes is None else file.NodesAt(indexes)
+            for n in nodes:
                 yield { "node": n, "file": file }
 
     def set_entries_filtered(self, entries):
-        self.entries = [
-            e for e in entries if (
-                    self.MatchHas(e['node'])
-                    and self.MatchPriorities(e['node'])
-                    and self.MatchTags(e['node'])
-                    and self.MatchState(e['node'])
-                    and self.MatchDuration(e['node'])
-                    and self.MatchDate(e['node'])
-                    and self.MatchClock(e['node'])
-                    and self.FilterEntry(e['node'], e['file'])
-                )
-        ]
+        match = self.Filter()
+        self.entries = [e for e in entries if match(e['node'], e['file'])]
 
+    # Entries come from the agenda cache when nothing they were
+    # filtered from has changed since. When some files did change
+    # only those are filtered again and merged with the rest.
     def LoadAndFilterEntries(self):
-        self.set_entries_filtered(self.generate_entries())
+        sources = AgendaSources()
+        key, lists, changed = self.CachedEntries(sources)
+        if(changed):
+            agendaCache.Put(key, sources, lists)
+        self.RestoreEntries(lists)
+
+    # The entries of this view and the views it is made of for the
+    # files in sources, as far as they can be taken from the agenda
+    # cache. Returns the cache key, the entries and whether they are
+    # new to the cache. Does not touch the cache or the db otherwise,
+    # the agenda precompute thread calls it too.
+    def CachedEntries(self, sources):
+        key = self.CacheKey()
+        cached = agendaCache.Get(key)
+        files = [file for (file, env, generation) in sources]
+        if(cached is None):
+            self.FilterEntries(files)
+            return (key, self.SavedEntries(), True)
+        oldSources, lists = cached
+        if(agendaCache.IsCurrent(oldSources, sources)):
+            return (key, lists, False)
+        kept = agendaCache.UnchangedFiles(oldSources, sources)
+        self.FilterEntries([f for f in files if f not in kept])
+        return (key, self.MergeEntries(lists, kept, files), True)
+
+    # Fills in the entries of this view and the views it is made of,
+    # from the nodes of files when given.
+    def FilterEntries(self, files=None):
+        self.set_entries_filtered(self.generate_entries(files))
+
+    # The saved entries of the files in kept with the entries just
+    # filtered from the other files, in the order of files.
+    def MergeEntries(self, lists, kept, files):
+        order = dict((id(f), i) for i, f in enumerate(files))
+        merged = []
+        for v, saved in zip(self.Views(), lists):
+            entries = [(n, f) for (n, f) in saved if f in kept and id(f) in order]
+            entries += [(e['node'], e['file']) for e in v.entries]
+            # Stable, every file comes from one side only.
+            entries.sort(key=lambda e: order[id(e[1])])
+            merged.append(entries)
+        return merged
 
     def FilterEntry(self, node, file):
         return True
 
+    # ----------------------------------------------
+    # This view and the views it is made of, they all have entries.
+    def Views(self):
+        return [self]
+
+    def Definition(self):
+        return (type(self).__name__, repr(sorted(self._kwargs.items())))
+
+    # Duration filters compare against the current time.
+    def IsCacheable(self):
+        return not (self._afterDuration or self._beforeDuration or self.clockfilter)
+
+    def CacheKey(self):
+        if(not self.IsCacheable()):
+            return None
+        dates = self.DateRange()
+        if(dates is not None):
+            dates = (EnsureDate(dates[0]), EnsureDate(dates[1]))
+        return (self.Definition(), EnsureDate(self.selected_date), datetime.date.today(), dates, AgendaFilterSettings())
+
+    # The entries are marked up while rendering, only the nodes
+    # and files are kept and the entries are made over again.
+    def SavedEntries(self):
+        return [[(e['node'], e['file']) for e in v.entries] for v in self.Views()]
+
+    def RestoreEntries(self, lists):
+        for v, entries in zip(self.Views(), lists):
+            v.entries = [{"node": n, "file": f} for (n, f) in entries]
+
 def IsBeforeNow(ts, now):
     if(isinstance(ts,orgdate.OrgDate)):
         return ts and (not ts.has_time() or ts.start.time() < now.time())
@@ -897,6 +1396,14 @@ class CalendarView(AgendaBaseView):
     def AddRepeating(self, date):
         self.dv.AddToDayHighlights(date, "repeat", "orgagenda.blocked")
 
+    # IsInMonth looks at the month before and after the selected one.
+    def DateRange(self):
+        date  = EnsureDate(self.selected_date)
+        first = (date.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+        last  = date.replace(day=28) + datetime.timedelta(days=4)
+        last  = last.replace(day=calendar.monthrange(last.year, last.month)[1])
+        return (first, last)
+
     def AddTodo(self, date):
         if(isinstance(date,orgdate.OrgDate)):
             date = date.start
@@ -938,7 +1445,13 @@ def bystartnodedatekey(a):
         return datetime.datetime.combine(dt.today(), datetime.datetime.min.time())
     return dt
 
+# The agenda date, sort key and clocked time of a node are asked for
+# on every sort and render, they are kept with the node's tree until
+# it changes.
 def getdatefromnode(n):
+    return n.env.derive(n, "agendadate", computedatefromnode)
+
+def computedatefromnode(n):
     dt = datetime.datetime.min
     timestamps = n.get_timestamps(active=True,point=True,range=True)
     if timestamps and len(timestamps) > 0:
@@ -963,6 +1476,9 @@ def getdate(a):
 
 def getsortkey(a):
     n = a['node']
+    return n.env.derive(n, "agendasortkey", computesortkey)
+
+def computesortkey(n):
     dt = getdatefromnode(n)
     result = 0
     if dt:
@@ -984,6 +1500,15 @@ def getsortkey(a):
         result += 3
     return result
 
+def getclockedfromnode(n):
+    return n.env.derive(n, "agendaclocked", computeclockedfromnode)
+
+def computeclockedfromnode(n):
+    dur = datetime.timedelta(days=0)
+    for c in n.clock:
+        dur += c.duration
+    return dur
+
 def truncate_date_from_filename(filename):
     return filename[11:] if re.match(r"\A\d\d\d\d-\d\d-\d\d_", filename) else filename
 
@@ -1035,13 +1560,13 @@ class WeekView(AgendaBaseView):
         row, c = self.view.rowcol(pt)
         if(date.day == datetime.datetime.now().day):
             if(date.day == self.selected_date.day):
-                self.view.insert(edit, self.view.size(),"@" + name + " " + "{0:2}".format(date.day) + "W[")
+                marker = "@"
             else:
-                self.view.insert(edit, self.view.size(),"#" + name + " " + "{0:2}".format(date.day) + "W[")
+                marker = "#"
         elif(date.day == self.selected_date.day):
-            self.view.insert(edit, self.view.size(),"&" + name + " " + "{0:2}".format(date.day) + "W[")
+            marker = "&"
         else:
-            self.view.insert(edit, self.view.size()," " + name + " " + "{0:2}".format(date.day) + "W[")
+            marker = " "
 
         daydata = []
         for entry in self.entries:
@@ -1066,11 +1591,6 @@ class WeekView(AgendaBaseView):
                 continue
         daydata.sort(key=bystartnodedatekey)
 
-        lastMatchStart = 0
-        lastMatch      = None
-        lastMatchEntry = None
-        matchCount     = 0
-        doneMatchCount = 0
         dayStart = sets.Get("agendaDayStartTime",6)
         dayEnd   = sets.Get("agendaDayEndTime",19)
         if(dayEnd > 23):
@@ -1080,60 +1600,86 @@ class WeekView(AgendaBaseView):
         if(dayStart > dayEnd):
             dayStart = 0
             dayEnd   = 23
-        for hour in range(dayStart,dayEnd+1):
-            for minSlot in range(0,self.cellSize):
-                match = None
-                matche = None
-                for entry in daydata:
-                    n = entry['node']
-                    ts = IsInHourAndMinute(n, hour, minSlot*12, (minSlot+1)*12,date)
-                    entry['ts'] = ts
-                    if(ts):
-                        match = n
-                        matche = entry
-                if(lastMatch != match and lastMatch != None):
-                    s = self.view.text_point(row,lastMatchStart)
-                    e = self.view.text_point(row,self.startOffset + (hour-dayStart)*self.cellSize + minSlot)
-                    reg = sublime.Region(s, e)
-                    if(IsDone(lastMatch) or IsArchived(lastMatch)):
-                        style = "orgagenda.week.done." + str(doneMatchCount)
-                        doneMatchCount = (doneMatchCount + 1) % 2
-                        self.MarkEntryAtRegion(lastMatchEntry,reg)
-                        self.view.add_regions("week_done_" + str(date.day) + "_" + str(hour) + "_" + str(minSlot),[reg],style,"", sublime.DRAW_SQUIGGLY_UNDERLINE)
-                    else:
-                        style = "orgagenda.week." + str(matchCount)
-                        matchCount = (matchCount + 1) % 10
-                        self.MarkEntryAtRegion(lastMatchEntry,reg)
-                        self.view.add_regions("week_" + str(date.day) + "_" + str(hour) + "_" + str(minSlot),[reg],style,"",sublime.DRAW_NO_FILL)
-                if(match != None):
-                    if(lastMatch != match):
-                        lastMatch      = match
-                        lastMatchEntry = matche
-                        lastMatchStart = self.startOffset + (hour-dayStart)*self.cellSize + minSlot
-                    d = distanceFromStart(matche, hour, minSlot)
-                    # If the time slot is larger than the name we space pad it
-                    c = " "
-                    if(d < len(match.heading) and d >= 0):
-                        c = match.heading[d:d+1]
-                    self.view.insert(edit, self.view.size(), c)
+        # Rasterise the entries into the slots of the day, later
+        # entries win a slot just like they always have.
+        first  = dayStart*self.cellSize
+        count  = (dayEnd+1)*self.cellSize - first
+        owners = [None] * count
+        stamps = [None] * count
+        for entry in daydata:
+            for slot, ts in InMinuteSlots(entry['node'], date).items():
+                if(slot >= first and slot < first + count):
+                    owners[slot-first] = entry
+                    stamps[slot-first] = ts
+
+        cells          = []
+        runs           = []
+        lastMatchStart = 0
+        lastMatch      = None
+        lastMatchEntry = None
+        for i in range(0,count):
+            matche = owners[i]
+            match  = matche['node'] if matche else None
+            col    = self.startOffset + i
+            hour, minSlot = divmod(first + i, self.cellSize)
+            if(lastMatch != match and lastMatch != None):
+                runs.append((lastMatch, lastMatchEntry, lastMatchStart, col))
+            if(match != None):
+                if(lastMatch != match):
+                    lastMatch      = match
+                    lastMatchEntry = matche
+                    lastMatchStart = col
+                matche['ts'] = stamps[i]
+                d = distanceFromStart(matche, hour, minSlot)
+                # If the time slot is larger than the name we space pad it
+                c = " "
+                if(d < len(match.heading) and d >= 0):
+                    c = match.heading[d:d+1]
+                cells.append(c)
+            else:
+                if(lastMatch != match):
+                    lastMatch      = match
+                    lastMatchStart = col
+                    lastMatchEntry = matche
+                if(minSlot < 4):
+                    cells.append(".")
                 else:
-                    if(lastMatch != match):
-                        lastMatch      = match
-                        lastMatchStart = self.startOffset + (hour-dayStart)*self.cellSize + minSlot
-                        lastMatchEntry = matche
-                    if(minSlot < 4):
-                        self.view.insert(edit, self.view.size(), ".")
-                    else:
-                        self.view.insert(edit, self.view.size(), "_")
-        self.view.insert(edit, self.view.size(),"]\n")
+                    cells.append("_")
+        self.view.insert(edit, self.view.size(), marker + name + " " + "{0:2}".format(date.day) + "W[" + "".join(cells) + "]\n")
+
+        # One region set per style instead of one per block.
+        regions        = {}
+        matchCount     = 0
+        doneMatchCount = 0
+        for (match, entry, s, e) in runs:
+            reg = sublime.Region(self.view.text_point(row,s), self.view.text_point(row,e))
+            self.MarkEntryAtRegion(entry,reg)
+            if(IsDone(match) or IsArchived(match)):
+                key = ("week_done_" + str(date.day) + "_" + str(doneMatchCount), "orgagenda.week.done." + str(doneMatchCount), sublime.DRAW_SQUIGGLY_UNDERLINE)
+                doneMatchCount = (doneMatchCount + 1) % 2
+            else:
+                key = ("week_" + str(date.day) + "_" + str(matchCount), "orgagenda.week." + str(matchCount), sublime.DRAW_NO_FILL)
+                matchCount = (matchCount + 1) % 10
+            regions.setdefault(key, []).append(reg)
+        for (key, style, flags), regs in regions.items():
+            self.view.add_regions(key,regs,style,"",flags)
+
+    def WeekStart(self):
+        wday   = self.selected_date.weekday()
+        firstDayIndex = sets.GetWeekdayIndexByName(sets.Get("firstDayOfWeek", "Sunday"))
+        return self.selected_date + datetime.timedelta(days=firstDayIndex-wday)
+
+    def DateRange(self):
+        wstart  = self.WeekStart()
+        numDays = sets.Get("agendaWeekViewNumDays",7)
+        return (wstart, wstart + datetime.timedelta(days=numDays-1))
 
     def RenderView(self, edit, clear=False):
         self.InsertAgendaHeading(edit)
         self.InsertTimeHeading(edit,self.selected_date.hour)
         #print(str(self.selected_date))
-        wday   = self.selected_date.weekday()
         firstDayIndex = sets.GetWeekdayIndexByName(sets.Get("firstDayOfWeek", "Sunday"))
-        wstart = self.selected_date + datetime.timedelta(days=firstDayIndex-wday)
+        wstart = self.WeekStart()
         dayNames  = sets.Get("weekViewDayNames",["Mon", "Tue", "Wed", "Thr", "Fri", "Sat", "Sun"])
         numDays   = sets.Get("agendaWeekViewNumDays",7)
         for i in range(0,numDays):
@@ -1211,16 +1757,19 @@ class AgendaDayView(AgendaBaseView):
             filename = entry['file'].AgendaFilenameTag()
             if not 'found' in entry:
                 entry['found'] = True
-                for h in range(0, 24):
-                    ts = IsInHour(n, h, self.selected_date)
-                    if ts:
-                        self.MarkEntryAt(entry, ts)
-                        line = self.BuildAgendaEntry(filename, n, h, ts)
-                        lines.append((ts.start.time(), line))
-                        break
+                hours = InHours(n, self.selected_date)
+                if hours:
+                    h  = min(hours)
+                    ts = hours[h]
+                    self.MarkEntryAt(entry, ts)
+                    line = self.BuildAgendaEntry(filename, n, h, ts)
+                    lines.append((ts.start.time(), line))
 
         view.insert(edit, view.size(), "".join([l + "\n" for (_t, l) in sorted(lines)]))
 
+    def DateRange(self):
+        return (self.selected_date, self.selected_date)
+
     def FilterEntry(self, node, file):
         return (not self.onlyTasks or IsTodo(node)) and not IsDone(node) and not IsArchived(node) and IsOnDate(node, self.selected_date)
 
@@ -1231,6 +1780,7 @@ class AgendaView(AgendaDayView):
         self.blocks = [None,None,None,None,None,None,None]
         self.sym     = ("$","@","!","#","%","^","&")
         self.symUsed = [-1,-1,-1,-1,-1,-1,-1]
+        self.hours   = {}
 
     def RenderDateHeading(self, edit, now):
         headerFormat = sets.Get("agendaHeaderFormat","%A \t%d %B %Y")
@@ -1291,10 +1841,17 @@ class AgendaView(AgendaDayView):
         return 0
 
 
+    # InHours for n, worked out once per render.
+    def HoursOf(self, n):
+        hours = self.hours.get(n)
+        if hours is None:
+            hours = self.hours[n] = InHours(n, self.selected_date)
+        return hours
+
     def ClearAgendaBlocks(self,h):
         for i in range(0, len(self.blocks)):
             n = self.blocks[i]
-            if(not IsInHour(n, h,self.selected_date)):
+            if(not self.HoursOf(n).get(h)):
                 self.ReleaseSymbol(i)
                 self.blocks[i] = None
 
@@ -1354,25 +1911,27 @@ class AgendaView(AgendaDayView):
         view     = self.view
         dayStart = sets.Get("agendaDayStartTime",6)
         dayEnd   = sets.Get("agendaDayEndTime",19)
-        allDat = []
         before = True
         now = datetime.datetime.now()
+        # Sort every entry into the hours it shows up in, in one go.
+        self.hours = {}
+        buckets = {}
         for entry in self.entries:
             n = entry['node']
-            filename = entry['file'].AgendaFilenameTag()
             ts = IsAllDay(n, self.selected_date.date())
             if ts:
                 entry['found'] = 'f'
                 self.MarkEntryAt(entry, ts)
-                self.RenderAgendaAllDayEntry(edit, filename, n)
+                self.RenderAgendaAllDayEntry(edit, entry['file'].AgendaFilenameTag(), n)
+            for h, ts in self.HoursOf(n).items():
+                buckets.setdefault(h, []).append((entry, ts))
         for h in range(dayStart, dayEnd):
             didNotInsert = True
+            bucket = buckets.get(h, [])
             if self.selected_date.date() == now.date() and now.hour == h:
                 foundItems = []
-                for entry in self.entries:
-                    n = entry['node']
-                    ts = IsInHour(n, h, self.selected_date)
-                    if IsBeforeNow(ts, now) and ts:
+                for (entry, ts) in bucket:
+                    if IsBeforeNow(ts, now):
                         entry['ts'] = ts
                         if not 'found' in entry:
                             foundItems.append(entry)
@@ -1386,10 +1945,8 @@ class AgendaView(AgendaDayView):
                     didNotInsert = False
                 view.insert(edit, view.size(), "{0:12} {1:02d}:{2:02d} - - - - - - - - - - - - - - - - - - - - - \n".format("now =>", now.hour, now.minute) )
                 foundItems = []
-                for entry in self.entries:
-                    n = entry['node']
-                    ts = IsInHour(n, h, self.selected_date)
-                    if IsAfterNow(ts, now) and ts:
+                for (entry, ts) in bucket:
+                    if IsAfterNow(ts, now):
                         entry['ts'] = ts
                         if not 'found' in entry or entry['found'] == 'b':
                             foundItems.append(entry)
@@ -1403,14 +1960,11 @@ class AgendaView(AgendaDayView):
                     didNotInsert = False
                 before = False
             else:
-                for entry in self.entries:
-                    n = entry['node']
-                    filename = entry['file'].AgendaFilenameTag()
-                    ts = IsInHour(n,h,self.selected_date)
-                    if ts and (not 'found' in entry or (not before and entry['found'] == 'b')):
+                for (entry, ts) in bucket:
+                    if not 'found' in entry or (not before and entry['found'] == 'b'):
                         entry['found'] = 'b' if before else 'a'
                         self.MarkEntryAt(entry, ts)
-                        self.RenderAgendaEntry(edit,filename,n,h,ts)
+                        self.RenderAgendaEntry(edit,entry['file'].AgendaFilenameTag(),entry['node'],h,ts)
                         didNotInsert = False
             if didNotInsert:
                 empty = " " * 12
@@ -1448,6 +2002,10 @@ class TodoView(AgendaBaseView):
         self.byproject    = "byproject" in kwargs
         self.input        = None
         self.search_filter = None
+        # Set up by RenderView, rows still to render and the
+        # entry index of every row rendered.
+        self.rows         = None
+        self.rowEntries   = None
         self.havesortorder = "sortascend" in kwargs or "sortdescend" in kwargs
         self.sortorder = False
         if self.havesortorder:
@@ -1507,8 +2065,7 @@ class TodoView(AgendaBaseView):
             duration = ""
             dur = datetime.timedelta(days=0)
             if n:
-                for c in n.clock:
-                    dur += c.duration
+                dur = getclockedfromnode(n)
                 self.totalduration += dur
                 duration = orgdate.OrgDate.format_duration(dur)
             data['duration'] = duration
@@ -1606,61 +2163,114 @@ class TodoView(AgendaBaseView):
         self.view.insert(edit, self.view.size(), formatstr.format(**data))
         self.view.insert(edit, self.view.size(), formatstr.format(**under))
         self.totalduration = datetime.timedelta(days=0)
+        self.firstRow   = self.view.rowcol(self.view.size())[0]
+        self.rowEntries = array.array('l')
+        self.rows       = self.Rows()
+        self.RenderRows(edit)
+        if(self.input == None):
+            self.input = insSel.OrgInput()
+            shouldFilter = sets.Get("agendaTodoFilterByDefault", False)
+            if shouldFilter:
+                self.OpenFilterView()
+
+    # What the view shows below the headings, the index of an entry or a
+    # line of text. Produced as the rows are rendered, so a long list
+    # only gets as far as somebody scrolls.
+    def Rows(self):
         if self.byproject:
             projects   = {}
             loosetasks = []
-            for entry in self.entries:
+            for i, entry in enumerate(self.entries):
                 n        = entry['node']
                 if n == None:
                     continue
                 if self.search_filter and not n.is_root() and not self.search_filter.match(n.heading):
                     continue
                 if n.is_root() or n.parent == None or n.parent.is_root() or not IsProject(n.parent):
-                    loosetasks.append(entry)
+                    loosetasks.append(i)
                 else:
                     pname = n.parent.heading
                     if pname not in projects:
                         projects[pname] = []
-                    projects[pname].append(entry)
+                    projects[pname].append(i)
             for pname,vals in projects.items():
-                vals.sort(key=getsortkey,reverse=self.getSortOrdering())
-                projects[pname] = vals
+                vals.sort(key=lambda i: getsortkey(self.entries[i]),reverse=self.getSortOrdering())
 
             for pname,vals in projects.items():
-                self.view.insert(edit, self.view.size(), "\n== [{0}] ==\n".format(pname))
-                for entry in vals:
-                    n        = entry['node']
-                    filename = entry['file'].AgendaFilenameTag()
-                    self.MarkEntryAt(entry)
-                    self.RenderEntry(n, filename, edit)
+                yield "\n== [{0}] ==\n".format(pname)
+                for i in vals:
+                    yield i
             if len(loosetasks) > 0:
-                self.view.insert(edit, self.view.size(), "\n== [] ==\n")
-                for entry in loosetasks:
-                    n        = entry['node']
-                    filename = entry['file'].AgendaFilenameTag()
-                    self.MarkEntryAt(entry)
-                    self.RenderEntry(n, filename, edit)
+                yield "\n== [] ==\n"
+                for i in loosetasks:
+                    yield i
         else:
             self.entries.sort(key=getsortkey,reverse=self.getSortOrdering())
-            for entry in self.entries:
+            for i, entry in enumerate(self.entries):
                 n        = entry['node']
                 if self.search_filter and not n.is_root() and not self.search_filter.match(n.heading):
                     continue
-                filename = entry['file'].AgendaFilenameTag()
-                self.MarkEntryAt(entry)
-                self.RenderEntry(n, filename, edit)
+                yield i
         if self.showtotalduration:
             formatstr = self.GetFormatString()
             data      = self.GetFormatData(None,"")
             data['duration'] = orgdate.OrgDate.format_duration(self.totalduration)
             data['filename'] = "TOTAL: "
-            self.view.insert(edit, self.view.size(), "----------------------------------------------------------------------------\n")
-            self.view.insert(edit, self.view.size(), formatstr.format(**data))
-        if(self.input == None):
-            self.input = insSel.OrgInput()
-            shouldFilter = sets.Get("agendaTodoFilterByDefault", False)
-            if shouldFilter:
-                self.OpenFilterView()
+            yield "----------------------------------------------------------------------------\n"
+            yield formatstr.format(**data)
+
+    # Renders the next page of rows, all of them when paging is off or
+    # something else is rendered after this view.
+    def RenderRows(self, edit):
+        count = sets.Get("agendaTodoPageSize", 500) if self.endsView else 0
+        rendered = 0
+        for item in self.rows:
+            if(isinstance(item, str)):
+                self.view.insert(edit, self.view.size(), item)
+                continue
+            entry = self.entries[item]
+            self.MarkRow(item)
+            self.RenderEntry(entry['node'], entry['file'].AgendaFilenameTag(), edit)
+            rendered += 1
+            if(count and rendered >= count):
+                break
+        try:
+            item = next(self.rows)
+        except StopIteration:
+            self.rows = None
+            return
+        self.rows    = itertools.chain([item], self.rows)
+        self.moreRow = self.view.rowcol(self.view.size())[0]
+        self.view.insert(edit, self.view.size(), "   ... more, move down to see them\n")
+
+    # Entry index of every row from firstRow on, -1 for other rows.
+    def MarkRow(self, index):
+        row = self.view.rowcol(self.view.size())[0] - self.firstRow
+        while(len(self.rowEntries) < row):
+            self.rowEntries.append(-1)
+        self.rowEntries.append(index)
+
+    def At(self, row, col):
+        if(self.rowEntries is None):
+            return AgendaBaseView.At(self, row, col)
+        i = row - self.firstRow
+        if(i >= 0 and i < len(self.rowEntries) and self.rowEntries[i] >= 0):
+            e = self.entries[self.rowEntries[i]]
+            return (e['node'], e['file'])
+        return (None, None)
+
+    def HasMore(self):
+        return self.rows is not None
+
+    def IsNearMore(self, row):
+        return self.HasMore() and row + 20 >= self.moreRow
+
+    # The more line is the last one in the view.
+    def RenderMore(self, edit):
+        if(not self.HasMore()):
+            return
+        self.view.erase(edit, sublime.Region(self.view.text_point(self.moreRow, 0), self.view.size()))
+        self.RenderRows(edit)
 
     def RenderEntry(self, n, filename, edit):
         formatstr = self.GetFormatString()
@@ -1807,6 +2417,15 @@ class CompositeViewListener(sublime_plugin.ViewEventListener):
     def on_hover_done(self):
         self.clear_phantoms()
 
+    # Long todo lists render a page at a time, the next
+    # page goes in once the cursor gets close to the end.
+    def on_selection_modified(self):
+        agenda = FindMappedView(self.view)
+        if(agenda and agenda.HasMore()):
+            sel = self.view.sel()
+            if(len(sel) > 0 and agenda.IsNearMore(self.view.rowcol(sel[0].end())[0])):
+                self.view.run_command("org_agenda_render_more")
+
     def on_hover(self, point, hover_zone):
         if(not hasattr(self,'agenda') or self.agenda == None):
             return
@@ -1856,10 +2475,11 @@ class CompositeViewListener(sublime_plugin.ViewEventListener):
 # ORG has this custom composite view feature.
 # I want that. Make a view up of a couple of views.
 class CompositeView(AgendaBaseView):
-    def __init__(self, name, views):
+    def __init__(self, name, views, setup=True):
         self.agendaViews = views
-        super(CompositeView, self).__init__(name)
-        self.SetupView()
+        super(CompositeView, self).__init__(name, setup)
+        if(setup):
+            self.SetupView()
 
     def RenderView(self, edit, clear=False):
         first = True
@@ -1868,6 +2488,7 @@ class CompositeView(AgendaBaseView):
                 self.view.insert(edit, self.view.size(), ("=" * 75) + "\n")
             first = False
             v.view = self.view
+            v.endsView = v is self.agendaViews[-1]
             v.RenderView(edit, clear)
         # These get updated when rendered
         self.entries = []
@@ -1884,11 +2505,61 @@ class CompositeView(AgendaBaseView):
         for v in self.agendaViews:
             v.UpdateSelectedDate(date)
 
-    def LoadAndFilterEntries(self):
-        AgendaBaseView.LoadAndFilterEntries(self)
+    # Only narrowed down when every part of the view is about dates.
+    def DateRange(self):
+        first = None
+        last  = None
+        for v in self.agendaViews:
+            dates = v.DateRange()
+            if dates is None:
+                return None
+            if first is None or EnsureDate(dates[0]) < first:
+                first = EnsureDate(dates[0])
+            if last is None or EnsureDate(dates[1]) > last:
+                last = EnsureDate(dates[1])
+        if first is None:
+            return None
+        return (first, last)
+
+    # Only narrowed down when every part of the view is.
+    def IndexedNodes(self, file):
+        found = set()
+        for v in self.agendaViews:
+            nodes = v.IndexedNodes(file)
+            if nodes is None:
+                return None
+            found |= nodes
+        return found
+
+    def FilterEntries(self, files=None):
+        AgendaBaseView.FilterEntries(self, files)
         for v in self.agendaViews:
             v.set_entries_filtered(self.entries)
 
+    # Only the last part can leave rows for later.
+    def HasMore(self):
+        return len(self.agendaViews) > 0 and self.agendaViews[-1].HasMore()
+
+    def IsNearMore(self, row):
+        return self.HasMore() and self.agendaViews[-1].IsNearMore(row)
+
+    def DoRenderMore(self, edit):
+        v = self.agendaViews[-1]
+        v.view = self.view
+        v.DoRenderMore(edit)
+
+    def Views(self):
+        views = [self]
+        for v in self.agendaViews:
+            views += v.Views()
+        return views
+
+    def Definition(self):
+        return (type(self).__name__, tuple(v.Definition() for v in self.agendaViews))
+
+    def IsCacheable(self):
+        return all(v.IsCacheable() for v in self.agendaViews)
+
     def At(self, row, col):
         for av in self.agendaViews:
             n, f  = av.At(row,col)
@@ -1930,11 +2601,17 @@ class AgendaWeekView(AgendaBaseView):
         for (idx, v) in enumerate(self.day_views):
             v.UpdateSelectedDate(self.selected_date + datetime.timedelta(days=idx - self.selected_date.weekday()))
 
-    def LoadAndFilterEntries(self):
-        AgendaBaseView.LoadAndFilterEntries(self)
+    def DateRange(self):
+        return (self.day_views[0].selected_date, self.day_views[-1].selected_date)
+
+    def FilterEntries(self, files=None):
+        AgendaBaseView.FilterEntries(self, files)
         for v in self.day_views:
             v.set_entries_filtered(self.entries)
 
+    def Views(self):
+        return [self] + self.day_views
+
     def set_entries_filtered(self, entries):
         AgendaBaseView.set_entries_filtered(self, entries)
         for v in self.day_views:
@@ -2087,7 +2764,7 @@ class CalendarViewRegistry:
             i += 1
         return (name, args)
 
-    def CreateCompositeView(self,views,name="Agenda"):
+    def CreateCompositeView(self,views,name="Agenda",setup=True):
         vlist = []
         for v in views:
             n, args = self.ParseArgs(v)
@@ -2100,7 +2777,7 @@ class CalendarViewRegistry:
                 vlist.append(vv)
         if len(vlist) == 1:
             vlist[0].name = name + " [" + vlist[0].name + "]"
-        cview = CompositeView(name, vlist)
+        cview = CompositeView(name, vlist, setup)
         return cview
 
 viewRegistry = CalendarViewRegistry()
@@ -2169,6 +2846,14 @@ class OrgAgendaReRenderViewCommand(sublime_plugin.TextCommand):
         if v != None:
             v.DoRenderView(edit, True)
 
+# ================================================================================
+# Renders the next page of a todo list that is rendered a page at a time.
+class OrgAgendaRenderMoreCommand(sublime_plugin.TextCommand):
+    def run(self, edit):
+        v = FindMappedView(self.view)
+        if v != None and v.HasMore():
+            v.DoRenderMore(edit)
+
 # ================================================================================
 class OrgAgendaReOpenFilterViewCommand(sublime_plugin.TextCommand):
     def run(self, edit):
@@ -2306,3 +2991,13 @@ class OrgAgendaRefreshCommand(sublime_plugin.TextCommand):
         agenda.LoadAndFilterEntries()
         agenda.Clear(edit)
         agenda.DoRenderView(edit)
+
+# Agenda views opened while the db was still indexing only show the
+# files that were loaded at the time, redraw them once the db is complete.
+def RefreshAgendaViews():
+    for window in sublime.windows():
+        for view in window.views():
+            if (ViewMappings.get(view.name())):
+                view.run_command("org_agenda_refresh")
+
+evt.Get().on("orgdbrebuilt", RefreshAgendaViews)
@@ -0,0 +1,137 @@
+import sublime
+import datetime
+import threading
+import logging
+import traceback
+import OrgExtended.orgdb as db
+import OrgExtended.orgagenda as agenda
+import OrgExtended.asettings as sets
+import OrgExtended.pymitter as evt
+
+log = logging.getLogger(__name__)
+
+# How often to look for the day rolling over while nothing changes.
+DAY_CHECK_INTERVAL = 60
+
+
+# Keeps the agenda cache warm for the agendas people open first.
+#
+# A while after the db changes, once things have settled down, the
+# custom agenda views named in agendaPrecomputeViews are filtered for
+# today and the days after it. Opening one of them then only has to
+# render, the entries come from the agenda cache. Files that changed
+# after that are filtered again when the agenda is opened, see
+# AgendaBaseView.LoadAndFilterEntries.
+#
+# The files to filter are taken on the main thread, the filtering is
+# done on this thread. The entries only go into the agenda cache back
+# on the main thread, and only if none of the files changed meanwhile.
+class AgendaPrecomputer(threading.Thread):
+    def __init__(self, delay):
+        threading.Thread.__init__(self)
+        self.daemon   = True
+        self.stopped  = threading.Event()
+        self.pending  = threading.Event()
+        self.delay    = delay
+        self.lastDay  = None
+
+    def stop(self):
+        self.stopped.set()
+        self.pending.set()
+        self.join()
+
+    def Schedule(self):
+        self.pending.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if (not self.pending.wait(DAY_CHECK_INTERVAL) and self.lastDay == datetime.date.today()):
+                continue
+            # A burst of saves is one update, wait until it is over.
+            while True:
+                self.pending.clear()
+                if (self.stopped.wait(self.delay)):
+                    return
+                if (not self.pending.is_set()):
+                    break
+            self.Precompute()
+
+    # The agenda sources as they are on the main thread, None when
+    # stopped or while the db is rebuilding. A rebuild in progress
+    # says so once it is done.
+    def Sources(self):
+        result = []
+        done   = threading.Event()
+        def Take():
+            if (not db.Get().IsBuilding()):
+                result.append(agenda.AgendaSources())
+            done.set()
+        sublime.set_timeout(Take, 0)
+        # Do not hold up stop() on the main thread.
+        while not done.wait(0.1):
+            if (self.stopped.is_set()):
+                return None
+        return result[0] if result else None
+
+    def Precompute(self):
+        sources = self.Sources()
+        if (sources is None):
+            return
+        today     = datetime.datetime.now()
+        days      = sets.Get("agendaPrecomputeDays", 2)
+        custom    = sets.Get("AgendaCustomViews",{ "Default": ["Calendar", "Week", "Day", "Blocked Projects", "Next Tasks", "Loose Tasks"]})
+        for toShow in sets.Get("agendaPrecomputeViews", ["Default"]):
+            if (toShow not in custom):
+                continue
+            for day in range(0, days):
+                # A newer update starts over.
+                if (self.stopped.is_set() or self.pending.is_set()):
+                    return
+                try:
+                    view = agenda.viewRegistry.CreateCompositeView(custom[toShow], toShow, setup=False)
+                    view.InitializeSelectedDate(today + datetime.timedelta(days=day))
+                    key, lists, changed = view.CachedEntries(sources)
+                except Exception:
+                    log.warning("Agenda precompute failed\n" + traceback.format_exc())
+                    continue
+                if (changed):
+                    sublime.set_timeout(lambda key=key, lists=lists: self.Publish(key, sources, lists), 0)
+        self.lastDay = today.date()
+        log.debug("Agenda precomputed for {0}".format(self.lastDay))
+
+    # Runs on the main thread.
+    def Publish(self, key, sources, lists):
+        if (self.stopped.is_set() or db.Get().IsBuilding() or not agenda.agendaCache.IsCurrent(sources)):
+            return
+        agenda.agendaCache.Put(key, sources, lists)
+
+
+precomputer = None
+
+def Schedule():
+    if (precomputer):
+        precomputer.Schedule()
+
+def Setup():
+    global precomputer
+    Shutdown()
+    delay = sets.Get("agendaPrecomputeDelay", 5)
+    if (delay is None or delay < 0 or not sets.Get("agendaPrecomputeViews", ["Default"])):
+        log.debug("Agenda precompute is disabled")
+        return
+    precomputer = AgendaPrecomputer(delay=delay)
+    precomputer.start()
+    precomputer.Schedule()
+    log.debug("AGENDA PRECOMPUTE IS UP AND RUNNING")
+
+def Shutdown():
+    global precomputer
+    if (precomputer):
+        precomputer.stop()
+        precomputer = None
+
+def Get():
+    return precomputer
+
+evt.Get().on("orgdbrebuilt", Schedule)
+evt.Get().on("orgdbupdated", Schedule)
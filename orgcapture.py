@@ -212,8 +212,8 @@ def onDeactivated(view):
         if (lastHeader is None):
             lastHeader = str(captureNode[1].heading)
         # We may haved moved around in the capture file
-        # so find the old heading.
-        for heading in captureFileRoot:
+        # so find the old heading. Iterate a copy, we replace nodes as we go.
+        for heading in list(captureFileRoot):
             if (type(heading) is node.OrgRootNode):
                 continue
             if str(heading.heading) == lastHeader:
@@ -0,0 +1,94 @@
+import datetime
+import bisect
+import logging
+
+log = logging.getLogger(__name__)
+
+# Ranges longer than this are not spread out over their days,
+# they are treated like something that can show up on any day.
+MAX_RANGE_DAYS = 366
+
+
+def ToDate(d):
+    if (isinstance(d, datetime.datetime)):
+        return d.date()
+    return d
+
+
+def DeadlineWarningStart(deadline):
+    warning = datetime.timedelta(days=14)
+    if (deadline.warning):
+        warning = deadline.warn_rule
+    return ToDate(deadline.start - warning)
+
+
+# Date occurrence index of a single parsed org file.
+#
+# Every node with an active timestamp, a SCHEDULED or a DEADLINE goes
+# into the buckets of the days its plain timestamps and ranges cover.
+# Things that can show up on any day from some point on (repeaters,
+# schedules that may be overdue and deadlines once their warning
+# period starts) are kept in a list sorted by that first day instead.
+#
+# Lookup only narrows the nodes down to the ones that can possibly
+# show up in a date range, the agenda views still decide what to
+# show for each of them.
+class OrgDateIndex:
+    def __init__(self, root):
+        self.env        = root.env
+        self.generation = root.env.generation
+        self.days       = {}
+        since = []
+        for n in root.env._nodes[1:]:
+            self.AddNode(n, since)
+        since.sort()
+        self.sinceDays  = [day for (day, index) in since]
+        self.sinceNodes = [index for (day, index) in since]
+
+    # The index holds node indexes, it is only good for
+    # the tree it was built from as long as that is unchanged.
+    def IsCurrent(self, root):
+        return self.env is root.env and self.generation == root.env.generation
+
+    def AddDay(self, day, index):
+        nodes = self.days.get(day)
+        if (nodes is None):
+            nodes = self.days[day] = set()
+        nodes.add(index)
+
+    def AddTimestamp(self, t, index, since):
+        start = ToDate(t.start)
+        if (t.repeating):
+            since.append((start, index))
+            return
+        end = ToDate(t.end) if t.has_end() else start
+        if ((end - start).days > MAX_RANGE_DAYS):
+            since.append((start, index))
+            return
+        day = start
+        while (day <= end):
+            self.AddDay(day, index)
+            day += datetime.timedelta(days=1)
+
+    def AddNode(self, n, since):
+        index = n._index
+        for t in n.get_timestamps(active=True, point=True, range=True):
+            self.AddTimestamp(t, index, since)
+        if (n.scheduled):
+            since.append((ToDate(n.scheduled.start), index))
+        if (n.deadline):
+            since.append((DeadlineWarningStart(n.deadline), index))
+
+    # Indexes of the nodes that can show up between the dates
+    # first and last (both included), in file order.
+    def Lookup(self, first, last):
+        first = ToDate(first)
+        last  = ToDate(last)
+        found = set(self.sinceNodes[:bisect.bisect_right(self.sinceDays, last)])
+        day = first
+        while (day <= last):
+            nodes = self.days.get(day)
+            if (nodes):
+                found.update(nodes)
+            day += datetime.timedelta(days=1)
+        return sorted(found)
@@ -4,6 +4,7 @@ import datetime
 import re
 from pathlib import Path
 import os
+import threading
 import OrgExtended.orgparse.loader as loader
 import OrgExtended.orgparse.node as node
 import OrgExtended.orgutil.util as util
@@ -11,6 +12,9 @@ import logging
 import traceback
 import OrgExtended.asettings as sets
 import OrgExtended.pymitter as evt
+import OrgExtended.orgdbcache as dbcache
+import OrgExtended.orgdateindex as dateindex
+import OrgExtended.orgnodeindex as nodeindex
 
 log = logging.getLogger(__name__)
 headingRe = re.compile("^([*]+) (.+)")
@@ -23,6 +27,13 @@ class FileInfo:
         self.filename = file
         self.key      = file.lower() if file else None
         self.change_count = 0
+        # Buffer lines the tree was last parsed from, when it came from a view.
+        self.lines    = None
+        # Built on first use and whenever the tree changed since. The
+        # agenda precompute thread builds them too, hence the lock.
+        self.dateIndex = None
+        self.nodeIndex = None
+        self.indexLock = threading.Lock()
         self.org.setFile(self)
         displayFn = self.key
         oldLen = len(displayFn) if displayFn else 0
@@ -66,14 +77,44 @@ class FileInfo:
     def Root(self):
         return self.org[0]
 
+    def DateIndex(self):
+        with self.indexLock:
+            index = self.dateIndex
+            if (index is None or not index.IsCurrent(self.org)):
+                index = dateindex.OrgDateIndex(self.org)
+                self.dateIndex = index
+            return index
+
+    def NodeIndex(self):
+        with self.indexLock:
+            index = self.nodeIndex
+            if (index is None or not index.IsCurrent(self.org)):
+                index = nodeindex.OrgNodeIndex(self.org)
+                self.nodeIndex = index
+            return index
+
+    # Nodes that can show up in an agenda between the dates first and last.
+    def NodesInRange(self, first, last):
+        return self.NodesAt(self.DateIndex().Lookup(first, last))
+
+    # Nodes for a sorted list of node indexes from one of the indexes.
+    def NodesAt(self, indexes):
+        nodes = self.org.env._nodes
+        return [nodes[i] for i in indexes]
+
     def RootInView(self, view, db):
         self.ReloadIfChanged(view, db)
         return self.Root()
 
     def LoadS(self, view):
         bufferContents = view.substr(sublime.Region(0, view.size()))
-        self.org = loader.loads(bufferContents, view.file_name() if view.file_name() else "<string>")
-        self.org.setFile(self)
+        lines = bufferContents.splitlines()
+        # Only the headings touched since the last parse are parsed again,
+        # anything reparse_lines can not handle falls back to a full parse.
+        if (self.lines is None or not node.reparse_lines(self.org, self.lines, lines)):
+            self.org = loader.loadi(lines, filename=view.file_name() if view.file_name() else "<string>")
+            self.org.setFile(self)
+        self.lines = lines
         # Keep track of last change count.
         self.change_count = view.change_count()
         self.RebuildBacklinks()
@@ -81,6 +122,7 @@ class FileInfo:
     def Reload(self):
         self.org = loader.load(self.filename)
         self.org.setFile(self)
+        self.lines = None
         self.RebuildBacklinks()
 
     def ResetChangeCount(self):
@@ -162,6 +204,26 @@ class OrgFileId:
         self.index = index
 
 
+def AddFileIds(file, found, ids, idmaps):
+    for id in found:
+        if (id not in idmaps):
+            fid = OrgFileId(file, id, len(ids))
+            ids.append(fid)
+            idmaps[id] = fid
+
+
+# Copy of ids without the entries that came from file.
+def WithoutFileIds(file, ids):
+    kept   = []
+    idmaps = {}
+    for fid in ids:
+        if (fid.file is not file):
+            fid.index = len(kept)
+            kept.append(fid)
+            idmaps[fid.id] = fid
+    return (kept, idmaps)
+
+
 class OrgDb:
     def __init__(self):
         self.files    = {}
@@ -173,6 +235,11 @@ class OrgDb:
         self.idmaps       = {}
         self.tags = set()
         self.backlinks = {}
+        self.building = False
+        self.rebuildGeneration = 0
+        # Held while Files and files change, a background rebuild and
+        # the main thread both add files.
+        self.lock = threading.RLock()
 
     def GetBacklinks(self, view):
         fn = view.file_name()
@@ -197,32 +264,74 @@ class OrgDb:
             self.tags.add(i)
 
     def RebuildCustomIdsForFile(self, file):
-        for id in file.org.env.customids:
-            if (id not in self.customidmaps):
-                index = len(self.customids)
-                fid = OrgFileId(file, id, index)
-                self.customids.append(fid)
-                self.customidmaps[id] = fid
+        AddFileIds(file, file.org.env.customids, self.customids, self.customidmaps)
 
     def RebuildIdsForFile(self, file):
-        for id in file.org.env.ids:
-            if (id not in self.idmaps):
-                index = len(self.ids)
-                fid = OrgFileId(file, id, index)
-                self.ids.append(fid)
-                self.idmaps[id] = fid
+        AddFileIds(file, file.org.env.ids, self.ids, self.idmaps)
 
     def RebuildAllIdsForFile(self, file):
         self.RebuildIdsForFile(file)
         self.RebuildCustomIdsForFile(file)
 
     def RebuildIds(self):
-        self.ids          = []
-        self.idmaps       = {}
-        self.customids    = []
-        self.customidmaps = {}
+        # Build the new tables on the side and swap them in, lookups made
+        # while a background rebuild is running never see them half built.
+        ids          = []
+        idmaps       = {}
+        customids    = []
+        customidmaps = {}
         for file in self.Files:
-            self.RebuildAllIdsForFile(file)
+            AddFileIds(file, file.org.env.ids, ids, idmaps)
+            AddFileIds(file, file.org.env.customids, customids, customidmaps)
+        self.ids          = ids
+        self.idmaps       = idmaps
+        self.customids    = customids
+        self.customidmaps = customidmaps
+
+    def RemoveIdsForFile(self, file):
+        (self.ids, self.idmaps) = WithoutFileIds(file, self.ids)
+        (self.customids, self.customidmaps) = WithoutFileIds(file, self.customids)
+
+    def RemoveBacklinksFromFile(self, file):
+        for f in list(self.backlinks.keys()):
+            links = [link for link in self.backlinks[f] if link.fromFile is not file]
+            if (links):
+                self.backlinks[f] = links
+            else:
+                del self.backlinks[f]
+
+    # Bring a single file up to date after it changed on disk,
+    # the rest of the db is left alone. root is the file already
+    # parsed, it is loaded here when not given.
+    def UpdateFile(self, filename, root=None):
+        if (root is None):
+            root = loader.load(filename)
+        with self.lock:
+            fi = self.files.get(filename.lower())
+            if (fi is None):
+                fi = FileInfo(filename, root, self.orgPaths)
+                fi.isOrgDir = True
+                self.PublishFileInfo(fi)
+                return fi
+            self.RemoveBacklinksFromFile(fi)
+            self.RemoveIdsForFile(fi)
+            fi.org = root
+            fi.lines = None
+            root.setFile(fi)
+            fi.RebuildBacklinks()
+            self.RebuildAllIdsForFile(fi)
+            return fi
+
+    # Drop a file that no longer exists on disk from the db.
+    def RemoveFile(self, filename):
+        with self.lock:
+            fi = self.files.get(filename.lower())
+            if (fi is None):
+                return
+            self.RemoveBacklinksFromFile(fi)
+            self.RemoveIdsForFile(fi)
+            self.Files = [f for f in self.Files if f is not fi]
+            del self.files[fi.key]
 
     def LoadNew(self, fileOrView):
         if (fileOrView is None):
@@ -248,13 +357,9 @@ class OrgDb:
             filename = fileOrView.file_name().lower()
         else:
             filename = fileOrView.lower()
-        for i in range(len(self.Files) - 1, -1, -1):
-            if (self.Files[i].key == filename):
-                del self.Files[i]
-
-        if (filename in self.files):
-            del self.files[filename]
-        # self.files.pop(filename,None)
+        with self.lock:
+            self.Files = [f for f in self.Files if f.key != filename]
+            self.files.pop(filename, None)
 
     def Reload(self, fileOrView):
         self.orgPaths = self.__GetPaths("orgDirs")
@@ -281,25 +386,33 @@ class OrgDb:
             filename = fileOrView
         return filename
 
-    def AddFileInfo(self, fi):
-        if (self.files is None):
-            self.files = {}
-        self.files[fi.key] = fi
-        if (self.Files is None):
-            self.Files = []
-        unique = True
-        for i, f in enumerate(self.Files):
-            if f.filename == fi.filename:
-                unique = False
-                self.Files[i] = fi
-                break
-        if unique:
-            self.Files.append(fi)
-        self.SortFiles()
-        fi.RebuildBacklinks()
+    def AddFileInfo(self, fi, sort=True):
+        with self.lock:
+            if (self.files is None):
+                self.files = {}
+            if (self.Files is None):
+                self.Files = []
+            # Only files we already know about need the linear search.
+            unique = fi.key not in self.files
+            self.files[fi.key] = fi
+            if not unique:
+                unique = True
+                for i, f in enumerate(self.Files):
+                    if f.filename == fi.filename:
+                        unique = False
+                        self.Files[i] = fi
+                        break
+            if unique:
+                self.Files.append(fi)
+            if sort:
+                self.SortFiles()
+            fi.RebuildBacklinks()
 
+    # Files is replaced by a sorted copy, never sorted in place, so
+    # anyone iterating it on another thread keeps a sane view.
     def SortFiles(self):
-        self.Files.sort(key=lambda x: x.key)
+        with self.lock:
+            self.Files = sorted(self.Files, key=lambda x: x.key)
 
     @staticmethod
     def IsExcluded(filename, excludedPaths, excludedFiles):
@@ -317,16 +430,24 @@ class OrgDb:
                     return True
         return False
 
-    def RebuildDb(self):
-        if (evt.Get().listeners('tagsfound')):
-            evt.Get().clear_listeners('tagsfound')
-        evt.Get().on("tagsfound", self.OnTags)
-        self.Files = []
-        self.files = {}
-        self.orgPaths = self.__GetPaths("orgDirs")
-        self.orgFiles = self.__GetPaths("orgFiles")
-        self.orgExcludePaths = self.__GetPaths("orgExcludeDirs")
-        self.orgExcludeFiles = self.__GetPaths("orgExcludeFiles")
+    # Parse a file for the db, restoring it from the
+    # persistent cache when that is in use.
+    def ParseFile(self, filename, cache=None):
+        if (cache):
+            return cache.Load(filename)
+        return loader.load(filename)
+
+    # Build the list of files that make up the db from the orgDirs
+    # and orgFiles settings, in the order they are found.
+    def CollectFiles(self):
+        filenames = []
+        seen = set()
+
+        def Add(filename):
+            key = filename.lower()
+            if (key not in seen):
+                seen.add(key)
+                filenames.append(filename)
         if (self.orgPaths):
             # Just in case the user gave us a string instead of a list.
             if (isinstance(self.orgPaths, str)):
@@ -359,14 +480,7 @@ class OrgDb:
                         for path in Path(orgPath).glob(suffix):
                             if OrgDb.IsExcluded(str(path), self.orgExcludePaths, self.orgExcludeFiles):
                                 continue
-                            try:
-                                filename = str(path)
-                                log.debug("PARSING: " + filename)
-                                file = FileInfo(filename, loader.load(filename), self.orgPaths)
-                                file.isOrgDir = True
-                                self.AddFileInfo(file)
-                            except Exception:
-                                log.warning("FAILED PARSING: %s\n  %s", str(path), traceback.format_exc())
+                            Add(str(path))
                     except Exception:
                         log.warning("ERROR globbing {}\n{}".format(orgPath, traceback.format_exc()))
         if (self.orgFiles):
@@ -377,15 +491,114 @@ class OrgDb:
                 path = orgFile.replace('\\', '/')
                 if OrgDb.IsExcluded(str(path), self.orgExcludePaths, self.orgExcludeFiles):
                     continue
+                Add(str(path))
+        return filenames
+
+    # Parse a list of files, yielding (filename, root) pairs in the
+    # order of filenames. root is None for files that failed to parse.
+    def ParseFiles(self, filenames, cache=None):
+        for filename in filenames:
+            try:
+                root = cache.Lookup(filename) if cache else None
+                if (root is None):
+                    log.debug("PARSING: " + filename)
+                    root = loader.load(filename)
+                    if (cache and filename.lower() in cache.pending):
+                        cache.Store(filename, root)
+            except Exception:
+                log.warning("FAILED PARSING: %s\n  %s", filename, traceback.format_exc())
+                root = None
+            yield (filename, root)
+
+    # Make a freshly parsed file visible while the db is being rebuilt.
+    # Files is only appended to here, anyone iterating it on another
+    # thread may see the new file but never skips or repeats one. The
+    # rebuild sorts it once it is done.
+    def PublishFileInfo(self, fi):
+        with self.lock:
+            self.AddFileInfo(fi, sort=False)
+            self.RebuildAllIdsForFile(fi)
+
+    # Rebuild the db from scratch, files become available one at a time
+    # as they are parsed. onProgress(done, total) is called after each
+    # file. Returns False if a newer rebuild took over before we were done.
+    def RebuildDb(self, useCache=None, onProgress=None):
+        self.rebuildGeneration += 1
+        generation = self.rebuildGeneration
+        if (useCache is None):
+            useCache = sets.Get("orgDbCache", True)
+        cache = None
+        if (useCache):
+            cache = dbcache.OrgDbCache()
+            cache.Open()
+        if (evt.Get().listeners('tagsfound')):
+            evt.Get().clear_listeners('tagsfound')
+        evt.Get().on("tagsfound", self.OnTags)
+        self.building = True
+        with self.lock:
+            self.Files = []
+            self.files = {}
+            self.ids          = []
+            self.idmaps       = {}
+            self.customids    = []
+            self.customidmaps = {}
+        self.orgPaths = self.__GetPaths("orgDirs")
+        self.orgFiles = self.__GetPaths("orgFiles")
+        self.orgExcludePaths = self.__GetPaths("orgExcludeDirs")
+        self.orgExcludeFiles = self.__GetPaths("orgExcludeFiles")
+        filenames = self.CollectFiles()
+        done = 0
+        for (filename, root) in self.ParseFiles(filenames, cache):
+            if (generation != self.rebuildGeneration):
+                log.debug("Org db rebuild superseded by a newer one")
+                return False
+            done += 1
+            if (root is not None):
                 try:
-                    filename = str(path)
-                    file = FileInfo(filename, loader.load(filename), self.orgPaths)
+                    file = FileInfo(filename, root, self.orgPaths)
                     file.isOrgDir = True
-                    self.AddFileInfo(file)
+                    self.PublishFileInfo(file)
                 except Exception:
-                    log.warning("FAILED PARSING: %s\n  %s", str(path), traceback.format_exc())
-        self.SortFiles()
-        self.RebuildIds()
+                    log.warning("FAILED PARSING: %s\n  %s", filename, traceback.format_exc())
+            if (onProgress):
+                onProgress(done, len(filenames))
+        with self.lock:
+            if (generation != self.rebuildGeneration):
+                return False
+            self.SortFiles()
+            self.RebuildIds()
+        self.building = False
+        if (cache):
+            cache.Save()
+            log.debug("Org db cache: %d restored, %d parsed", cache.hits, cache.misses)
+        return True
+
+    # Rebuild the db on a background thread so the editor stays usable.
+    # Progress is shown in the status bar and "orgdbrebuilt" is emitted
+    # on the main thread once the db is complete.
+    def RebuildDbAsync(self, useCache=None):
+        lastShown = [0]
+
+        def Progress(done, total):
+            if (done == total or done - lastShown[0] >= 10):
+                lastShown[0] = done
+                sublime.status_message("Org: indexing files {0}/{1}".format(done, total))
+
+        def Run():
+            try:
+                if (self.RebuildDb(useCache, Progress)):
+                    sublime.status_message("Org: indexed {0} files".format(len(self.Files)))
+                    sublime.set_timeout(lambda: evt.Get().emit("orgdbrebuilt"), 0)
+            except Exception:
+                self.building = False
+                log.error("Org db rebuild failed\n" + traceback.format_exc())
+        thread = threading.Thread(target=Run, name="OrgDbRebuild")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def IsBuilding(self):
+        return self.building
 
     def FindInfo(self, fileOrView):
         try:
@@ -558,6 +771,8 @@ class OrgDb:
             sublime.active_window().open_file(path, sublime.ENCODED_POSITION)
             return True
         else:
+            if (self.IsBuilding()):
+                sublime.status_message("Org: still indexing, {0} may not be loaded yet".format(id))
             log.info("Could not locate Custom ID failed to jump there")
             return False
 
@@ -570,6 +785,8 @@ class OrgDb:
             sublime.active_window().open_file(path, sublime.ENCODED_POSITION)
             return True
         else:
+            if (self.IsBuilding()):
+                sublime.status_message("Org: still indexing, {0} may not be loaded yet".format(id))
             log.info("Could not locate ID failed to jump there")
             return False
 
@@ -636,7 +853,7 @@ def Get():
 # rebuild our org database from our org directory
 class OrgRebuildDbCommand(sublime_plugin.TextCommand):
     def run(self, edit):
-        Get().RebuildDb()
+        Get().RebuildDbAsync()
 
 
 # Just reload the current file.
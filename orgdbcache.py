@@ -0,0 +1,162 @@
+import sublime
+import os
+import pickle
+import zlib
+import hashlib
+import logging
+import traceback
+import OrgExtended.orgparse as orgparse
+import OrgExtended.orgparse.loader as loader
+import OrgExtended.orgparse.node as node
+import OrgExtended.asettings as sets
+
+log = logging.getLogger(__name__)
+
+# Bump this if the layout of the cache file itself changes.
+CACHE_VERSION = 2
+CACHE_FILENAME = "OrgExtended.dbcache"
+
+
+def GetCachePath():
+    return os.path.join(sublime.packages_path(), "User", CACHE_FILENAME)
+
+
+def HashFile(filename):
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+# Only fold case where the filesystem does, two files differing in
+# case are different files elsewhere.
+def CacheKey(filename):
+    return os.path.normcase(os.path.abspath(filename))
+
+
+# Persistent store of parsed org files.
+#
+# Each entry is keyed by the normalized filename and remembers the
+# mtime, size and content hash of the file it was built from. As long
+# as those still match the parsed tree is restored with pickle instead
+# of running the parser again. The whole cache is thrown away when the
+# cache version, the parser version or the todoStates setting change,
+# since all of those alter what the parser produces.
+class OrgDbCache:
+    def __init__(self, filename=None):
+        self.filename = filename if filename else GetCachePath()
+        self.entries  = {}
+        self.seen     = set()
+        self.pending  = {}
+        self.dirty    = False
+        self.hits     = 0
+        self.misses   = 0
+
+    def Header(self):
+        return {
+            "version": CACHE_VERSION,
+            "parser": orgparse.__parser_version__,
+            "todoStates": list(sets.Get("todoStates", sets.defaultTodoStates)),
+        }
+
+    def Open(self):
+        self.entries = {}
+        self.seen    = set()
+        self.pending = {}
+        self.dirty   = False
+        self.hits    = 0
+        self.misses  = 0
+        if(not os.path.exists(self.filename)):
+            return
+        try:
+            with open(self.filename, "rb") as f:
+                data = pickle.load(f)
+            if(data.get("header") != self.Header()):
+                log.debug("Org db cache is out of date, ignoring it")
+                self.dirty = True
+                return
+            self.entries = data.get("files", {})
+        except Exception:
+            log.warning("Could not read org db cache %s\n%s", self.filename, traceback.format_exc())
+            self.entries = {}
+            self.dirty   = True
+
+    def Save(self):
+        # Forget files that no longer take part in the db.
+        for key in list(self.entries.keys()):
+            if(key not in self.seen):
+                del self.entries[key]
+                self.dirty = True
+        if(not self.dirty):
+            return
+        try:
+            tmp = self.filename + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump({"header": self.Header(), "files": self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.filename)
+            self.dirty = False
+        except Exception:
+            log.warning("Could not write org db cache %s\n%s", self.filename, traceback.format_exc())
+
+    def Clear(self):
+        self.entries = {}
+        self.seen    = set()
+        self.dirty   = False
+        if(os.path.exists(self.filename)):
+            os.remove(self.filename)
+
+    def Restore(self, entry):
+        root = pickle.loads(zlib.decompress(entry["data"]))
+        # Parsing announces tags as it goes, restoring has to do the same.
+        node.emit_tags(root)
+        return root
+
+    # Return the cached tree for filename or None if the file
+    # has to be parsed. A miss remembers the file state so Store
+    # can record it once the file is parsed.
+    def Lookup(self, filename):
+        key = CacheKey(filename)
+        self.seen.add(key)
+        stat  = os.stat(filename)
+        entry = self.entries.get(key)
+        digest = None
+        if(entry):
+            try:
+                if(entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size):
+                    self.hits += 1
+                    return self.Restore(entry)
+                # Touched but maybe not changed (git checkout, sync tools)
+                digest = HashFile(filename)
+                if(entry["hash"] == digest):
+                    entry["mtime"] = stat.st_mtime
+                    self.dirty = True
+                    self.hits += 1
+                    return self.Restore(entry)
+            except Exception:
+                log.warning("Bad org db cache entry for %s\n%s", filename, traceback.format_exc())
+        self.misses += 1
+        self.pending[key] = (stat, digest)
+        return None
+
+    def Store(self, filename, root):
+        key = CacheKey(filename)
+        (stat, digest) = self.pending.pop(key, (None, None))
+        try:
+            if(stat is None):
+                stat = os.stat(filename)
+            if(digest is None):
+                digest = HashFile(filename)
+            data = zlib.compress(pickle.dumps(root, protocol=pickle.HIGHEST_PROTOCOL))
+            self.entries[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest, "data": data}
+            self.dirty = True
+        except Exception:
+            log.warning("Could not cache %s\n%s", filename, traceback.format_exc())
+            self.entries.pop(key, None)
+
+    # Return the parsed tree for filename, from the cache if possible.
+    def Load(self, filename):
+        root = self.Lookup(filename)
+        if(root is None):
+            root = loader.load(filename)
+            self.Store(filename, root)
+        return root
@@ -0,0 +1,157 @@
+import sublime
+import os
+import threading
+import logging
+import traceback
+import OrgExtended.orgdb as db
+import OrgExtended.orgparse.loader as loader
+import OrgExtended.asettings as sets
+import OrgExtended.pymitter as evt
+
+log = logging.getLogger(__name__)
+
+
+def StatFile(filename):
+    try:
+        st = os.stat(filename)
+        return (st.st_mtime, st.st_size)
+    except OSError:
+        return None
+
+
+# True if the file is open in a view with unsaved changes, the db
+# holds the buffer for those and the disk copy must not replace it.
+def IsDirtyInEditor(filename):
+    for window in sublime.windows():
+        view = window.find_open_file(filename)
+        if (view and view.is_dirty()):
+            return True
+    return False
+
+
+def SnapshotKey(filename):
+    return os.path.normcase(os.path.abspath(filename))
+
+
+# Keeps the org db in sync with changes made outside the editor.
+#
+# Every interval the files that make up the db are collected and
+# stat'ed, the result is compared with the snapshot from the last
+# poll and only files that were created, modified or deleted are
+# parsed or dropped. The rest of the db is not touched.
+#
+# The db belongs to the main thread, the poll only stats and parses
+# files and hands the results over with sublime.set_timeout.
+class OrgDbWatcher(threading.Thread):
+    def __init__(self, interval):
+        threading.Thread.__init__(self)
+        self.daemon     = True
+        self.stopped    = threading.Event()
+        self.interval   = interval
+        self.snapshot   = None
+        self.generation = None
+        self.lock       = threading.Lock()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.Poll()
+            except Exception:
+                log.warning("Org db watcher failed\n" + traceback.format_exc())
+
+    # Snapshot entries are (filename, (mtime, size)) by SnapshotKey.
+    def TakeSnapshot(self):
+        snapshot = {}
+        for filename in db.Get().CollectFiles():
+            stat = StatFile(filename)
+            if (stat):
+                snapshot[SnapshotKey(filename)] = (filename, stat)
+        return snapshot
+
+    # The editor saved filename and reloaded it into the db itself,
+    # the next poll must not parse it again.
+    def Saved(self, filename):
+        stat = StatFile(filename)
+        key  = SnapshotKey(filename)
+        with self.lock:
+            if (stat and self.snapshot is not None and key in self.snapshot):
+                self.snapshot[key] = (self.snapshot[key][0], stat)
+
+    def Poll(self):
+        orgDb = db.Get()
+        if (orgDb.IsBuilding()):
+            return
+        generation = orgDb.rebuildGeneration
+        snapshot = self.TakeSnapshot()
+        with self.lock:
+            # A full rebuild already saw the disk as it is, start over from here.
+            if (self.snapshot is None or self.generation != generation):
+                self.snapshot   = snapshot
+                self.generation = generation
+                return
+            changed = [(key, entry) for key, entry in snapshot.items() if self.snapshot.get(key) != entry]
+            removed = [entry[0] for key, entry in self.snapshot.items() if key not in snapshot]
+            old = self.snapshot
+            self.snapshot = snapshot
+        parsed = []
+        for key, (filename, stat) in changed:
+            try:
+                log.debug("WATCHER PARSING: " + filename)
+                parsed.append((key, filename, loader.load(filename), old.get(key)))
+            except Exception:
+                log.warning("FAILED PARSING: %s\n  %s", filename, traceback.format_exc())
+        if (parsed or removed):
+            sublime.set_timeout(lambda: self.Apply(generation, parsed, removed), 0)
+
+    # Runs on the main thread, brings the db up to date with what Poll found.
+    def Apply(self, generation, parsed, removed):
+        orgDb = db.Get()
+        if (orgDb.IsBuilding() or orgDb.rebuildGeneration != generation):
+            return
+        changed = False
+        for key, filename, root, oldEntry in parsed:
+            if (IsDirtyInEditor(filename)):
+                # Leave it for the next poll.
+                with self.lock:
+                    if (self.snapshot is not None):
+                        if (oldEntry):
+                            self.snapshot[key] = oldEntry
+                        else:
+                            self.snapshot.pop(key, None)
+                continue
+            orgDb.UpdateFile(filename, root)
+            changed = True
+        for filename in removed:
+            log.debug("WATCHER REMOVING: " + filename)
+            orgDb.RemoveFile(filename)
+            changed = True
+        if (changed):
+            sublime.status_message("Org: picked up changes to org files")
+            evt.Get().emit("orgdbupdated")
+
+
+watcher = None
+
+def Setup():
+    global watcher
+    Shutdown()
+    interval = sets.Get("orgDbWatchInterval", 30)
+    if (not interval or interval <= 0):
+        log.debug("Org db watcher is disabled")
+        return
+    watcher = OrgDbWatcher(interval=max(interval, 2))
+    watcher.start()
+    log.debug("ORG DB WATCHER IS UP AND RUNNING: " + str(interval))
+
+def Shutdown():
+    global watcher
+    if (watcher):
+        watcher.stop()
+        watcher = None
+
+def Get():
+    return watcher
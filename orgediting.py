@@ -162,8 +162,8 @@ class OrgTodoChangeCommand(sublime_plugin.TextCommand):
                         if(t.repeatpre == "+"):
                             next = t.next_repeat_from(oa.EnsureDateTime(next))
                         elif(t.repeatpre == "++"):
-                            while(next < now):
-                                next = t.next_repeat_from(oa.EnsureDateTime(next))
+                            if(oa.EnsureDateTime(next) < now):
+                                next = t.repeat_rule.after(now, inc=True)
                         elif(t.repeatpre == ".+"):
                             next = t.next_repeat_from(now)
                         s = m.start(1)
@@ -15,6 +15,8 @@ import sys
 import traceback 
 import OrgExtended.orgfolding as folding
 import OrgExtended.orgdb as db
+import OrgExtended.orgdbwatch as dbwatch
+import OrgExtended.orgagendaprecompute as precompute
 import OrgExtended.asettings as sets
 import OrgExtended.orgcapture as capture
 import OrgExtended.orglinks as links
@@ -37,6 +39,8 @@ def sync_up_on_loaded():
     window = sublime.active_window()
     window.run_command("org_on_load_sync_up", {})
     notice.Setup()
+    dbwatch.Setup()
+    precompute.Setup()
     datepicker.SetupMouse()
     # Install required packages to operate org extended
     InstallIfNeeded(pkgcon.TABLE_PACKAGE, "Table Editor")
@@ -72,7 +76,9 @@ def plugin_loaded():
             logger.debug('debug logger initialized')
     global log
     log = logging.getLogger(__name__)
-    db.Get().RebuildDb()
+    # Parsing every org file can take a while, do it in the background.
+    # The db fills up as files are parsed.
+    db.Get().RebuildDbAsync()
     #window = sublime.active_window()
     #if window is None:
     sublime.set_timeout_async(lambda: sync_up_on_loaded(), 1000)
@@ -81,6 +87,8 @@ def plugin_loaded():
 # This is called when our plugin unloads!
 def plugin_unloaded():
     links.onShutdown()
+    dbwatch.Shutdown()
+    precompute.Shutdown()
     if(notice):
         notice.Get().stop()
 
@@ -108,6 +116,10 @@ class OrgCore(sublime_plugin.EventListener):
     def on_post_save(self, view):
         if(util.isPotentialOrgFile(view.file_name())):
             db.Get().Reload(view)
+            watcher = dbwatch.Get()
+            if(watcher):
+                watcher.Saved(view.file_name())
+            evt.Get().emit("orgdbupdated")
 
     def on_deactivated(self, view):
         capture.onDeactivated(view)
@@ -0,0 +1,51 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# Inverted indexes of a single parsed org file.
+#
+# The nodes with each todo state ("" for none) and the nodes with each
+# tag, inherited and file tags included. Agenda views with a state or
+# tag filter only look at the nodes these say can match.
+class OrgNodeIndex:
+    def __init__(self, root):
+        self.env        = root.env
+        self.generation = root.env.generation
+        self.states     = {}
+        self.tags       = {}
+        for n in root.env._nodes[1:]:
+            self.AddNode(n)
+
+    # The index holds node indexes, it is only good for
+    # the tree it was built from as long as that is unchanged.
+    def IsCurrent(self, root):
+        return self.env is root.env and self.generation == root.env.generation
+
+    def AddNode(self, n):
+        index = n._index
+        self.states.setdefault(n.todo or "", set()).add(index)
+        for tag in n.tags:
+            self.tags.setdefault(tag, set()).add(index)
+
+    # Indexes of the nodes whose state is accepted by match.
+    def WithState(self, match):
+        found = set()
+        for state, nodes in self.states.items():
+            if (match(state)):
+                found.update(nodes)
+        return found
+
+    # Indexes of the nodes with all the tags in alltags and one of the
+    # tags in oneof, when those are given.
+    def WithTags(self, alltags, oneof):
+        found = None
+        for tag in alltags:
+            nodes = self.tags.get(tag, set())
+            found = set(nodes) if found is None else found & nodes
+        if (oneof):
+            nodes = set()
+            for tag in oneof:
+                nodes.update(self.tags.get(tag, ()))
+            found = nodes if found is None else found & nodes
+        return found
@@ -1,5 +1,8 @@
 
 __version__ = '0.1.4dev0'
+# Bump this whenever the shape of the parsed tree changes.
+# Persisted parse results (see orgdbcache) are discarded when it does not match.
+__parser_version__ = 7
 __author__ = 'Takafumi Arakaki, Dmitrii Gerasimov'
 __license__ = 'BSD License'
 __all__ = ["load", "loads", "loadi"]
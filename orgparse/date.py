@@ -142,6 +142,118 @@ TIMESTAMP_RE = re.compile(
     '|'.join((gene_timestamp_regex('active'),
               gene_timestamp_regex('inactive'))),
     re.VERBOSE)
+
+
+def make_repeat_rule(freq, interval, dtstart):
+    return OrgRepeatRule(freq, interval=interval, dtstart=dtstart)
+
+
+def _as_datetime(d):
+    if isinstance(d, datetime.datetime):
+        return d
+    return datetime.datetime(d.year, d.month, d.day)
+
+
+class OrgRepeatRule(object):
+    """
+    Occurrences of an org repeater such as ``+1w``, ``++2d`` or ``.+1m``.
+
+    Follows the rules of the dateutil rrule org repeaters used to be
+    built on: every ``interval`` days, weeks, months or years from
+    ``dtstart``, skipping months without the start day and February
+    29th in common years. Occurrences are found with date arithmetic
+    instead of stepping through every one of them.
+
+    >>> r = OrgRepeatRule(dr.MONTHLY, interval=1, dtstart=datetime.date(2021, 1, 31))
+    >>> r.after(datetime.datetime(2021, 1, 31))
+    datetime.datetime(2021, 3, 31, 0, 0)
+    >>> r.occurrence_on(datetime.date(2021, 5, 31))
+    datetime.datetime(2021, 5, 31, 0, 0)
+    >>> r.occurrence_on(datetime.date(2021, 6, 30))
+
+    """
+
+    # How many periods to look ahead for one that has the start day.
+    _MAX_SKIP = 400
+
+    def __init__(self, freq, interval=1, dtstart=None):
+        self._freq     = freq
+        self._interval = max(int(interval), 1)
+        self._dtstart  = _as_datetime(dtstart).replace(microsecond=0)
+        if freq == dr.WEEKLY:
+            self._step = datetime.timedelta(weeks=self._interval)
+        elif freq == dr.DAILY:
+            self._step = datetime.timedelta(days=self._interval)
+        else:
+            self._step = None
+
+    def __reduce__(self):
+        return (make_repeat_rule, (self._freq, self._interval, self._dtstart))
+
+    def _period_start(self, i):
+        """The occurrence in the i-th period, None if it has no start day."""
+        s = self._dtstart
+        if self._freq == dr.MONTHLY:
+            month = s.month - 1 + i * self._interval
+            year  = s.year + month // 12
+            month = month % 12 + 1
+        else:
+            year  = s.year + i * self._interval
+            month = s.month
+        if year > datetime.MAXYEAR or s.day > calendar.monthrange(year, month)[1]:
+            return None
+        return s.replace(year=year, month=month)
+
+    def _periods_to(self, dt):
+        """Index of the first period that does not end before dt."""
+        s = self._dtstart
+        if self._freq == dr.MONTHLY:
+            diff = (dt.year - s.year) * 12 + dt.month - s.month
+        else:
+            diff = dt.year - s.year
+        return max(0, -(-diff // self._interval))
+
+    def after(self, dt, inc=False):
+        """
+        First occurrence after ``dt``, or on it when ``inc`` is true.
+        ``dt`` may be a date, which stands for its midnight.
+        """
+        dt = _as_datetime(dt)
+        s  = self._dtstart
+        if s > dt or (inc and s == dt):
+            return s
+        if self._step:
+            cur = s + ((dt - s) // self._step) * self._step
+            if cur < dt or (cur == dt and not inc):
+                cur += self._step
+            return cur
+        first = self._periods_to(dt)
+        for i in range(first, first + self._MAX_SKIP):
+            cur = self._period_start(i)
+            if cur is not None and (cur > dt or (inc and cur == dt)):
+                return cur
+        return None
+
+    def occurrence_on(self, day):
+        """The occurrence that falls on the date ``day``, None if there is none."""
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        s = self._dtstart
+        if day < s.date():
+            return None
+        if self._step:
+            if (day - s.date()).days % self._step.days:
+                return None
+        elif self._freq == dr.MONTHLY:
+            months = (day.year - s.year) * 12 + day.month - s.month
+            if day.day != s.day or months % self._interval:
+                return None
+        else:
+            if day.day != s.day or day.month != s.month or (day.year - s.year) % self._interval:
+                return None
+        return datetime.datetime.combine(day, s.time())
+
+
 def copy_repeat_info(f,t):
     if(f and hasattr(f,'repeat_rule') and f.repeat_rule):
         t.repeatpre = f.repeatpre
@@ -169,7 +281,7 @@ def get_repeat_info(rv,mdict):
                 if(rv.repeatnum <= 0):
                     rv.repeatnum = 1
                 # Build an org mode repeat rule
-                rv.repeat_rule = dr.rrule(rv.freq,interval=rv.repeatnum,dtstart=rv.start,cache=True) 
+                rv.repeat_rule = OrgRepeatRule(rv.freq,interval=rv.repeatnum,dtstart=rv.start) 
                 # This determines what to do when you mark the task as done.
                 # + just bump to the next FIXED interval (even if thats in the past)
                 # ++ bump to the next FIXED interval, in the future. (IE next sunday) even if you missed some.
@@ -439,6 +551,10 @@ class OrgDate(object):
         #now = now.replace(hour=0,minute=0,second=0,microsecond=0)
         return self.repeat_rule.after(now,inc=False) 
 
+    def repeat_on(self, day):
+        """The repeat of this date that falls on ``day``, None if there is none."""
+        return self.repeat_rule.occurrence_on(day)
+
     @property
     def start(self):
         """
@@ -747,7 +863,7 @@ class OrgDateSDCBase(OrgDate):
                 if(rv.repeatnum <= 0):
                     rv.repeatnum = 1
                 # Build an org mode repeat rule
-                rv.repeat_rule = dr.rrule(rv.freq,interval=rv.repeatnum,dtstart=rv.start,cache=True) 
+                rv.repeat_rule = OrgRepeatRule(rv.freq,interval=rv.repeatnum,dtstart=rv.start) 
                 # This determines what to do when you mark the task as done.
                 # + just bump to the next FIXED interval (even if thats in the past)
                 # ++ bump to the next FIXED interval, in the future. (IE next sunday) even if you missed some.
@@ -190,10 +190,13 @@ def loads(string, filename='<string>'):
     return loadi(string.splitlines(), filename=filename)
 
 
-def loadi(lines, filename='<lines>'):
+def loadi(lines, filename='<lines>', lazy=None):
     """
     Load org-mode document from an iterative object.
 
+    :arg lazy: Parse node bodies on first use, taken from the
+               settings when None.
+
     :rtype: :class:`orgparse.node.OrgRootNode`
 
     """
@@ -210,4 +213,6 @@ def loadi(lines, filename='<lines>'):
             dones.append(i)
         else:
             todos.append(i)
-    return node.parse_lines(lines, filename=filename, todos=todos, dones=dones)
+    if lazy is None:
+        lazy = sets.Get("orgLazyParse", True)
+    return node.parse_lines(lines, filename=filename, todos=todos, dones=dones, lazy=lazy)
@@ -1,5 +1,6 @@
 import re
 import itertools
+import bisect
 import sublime
 try:
     from collections.abc import Sequence
@@ -10,6 +11,7 @@ from .date import OrgDate, OrgDateClock, OrgDateRepeatedTask, parse_sdc
 from .inline import to_plain_text
 from .utils.py3compat import PY3, unicode
 import copy
+import threading
 from .startup import *
 import OrgExtended.pymitter as evt
 import datetime
@@ -18,6 +20,7 @@ import datetime
 RE_TARGETS = re.compile(r'<<(?P<target>[^>]+)>>')
 RE_COMMENT = re.compile(r'^\s*[#][+](?P<name>[A-Za-z][A-Za-z0-9_]+)[:]\s*(?P<val>.*)$')
 RE_TABLE_MATCH = re.compile(r"^\s*\|")
+RE_LINK = re.compile(r"\[\[(?P<link>[^\]]+)\](\[(?P<desc>[^\]]+)\])?\]")
 
 class OffsetIter:
     def __init__(self, lines):
@@ -259,17 +262,134 @@ class OrgEnv(object):
         self.customids = {}
         self.ids = {}
         self.NamedObjects = {}
+        # Set once the tree is changed in memory and no longer
+        # matches the lines it was parsed from.
+        self._edited = False
+        # Start row of every node for OrgRootNode.at, None until
+        # it is needed again after the nodes changed.
+        self._rows = None
+        # Parent, sibling and subtree end of every node, see structure().
+        self._struct = None
+        # Parse node bodies on first use, see OrgNode._parse_pre.
+        self._lazy = False
+        # Counts the changes to the nodes, anything derived from the
+        # tree can compare it to tell whether it is out of date.
+        self.generation = 0
+        # Values worked out from single nodes, see derive().
+        self._derived = {}
 
     @property
     def links(self):
         return self._links
 
+    def edited(self):
+        self._edited = True
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the indexes derived from the node list."""
+        self._rows = None
+        self._struct = None
+        self._derived = {}
+        self.generation += 1
+
+    def derive(self, node, name, compute):
+        """
+        Return ``compute(node)``, worked out once until the nodes change.
+
+        For values that are asked for over and over, like the sort keys
+        of the agenda. They may look at the parents of the node too, so
+        every change to the tree drops all of them.
+        """
+        key = (node._index, name)
+        derived = self._derived
+        if key in derived:
+            return derived[key]
+        value = derived[key] = compute(node)
+        return value
+
+    # The indexes are cheap to rebuild, no need to store them.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_rows'] = None
+        state['_struct'] = None
+        state['_derived'] = {}
+        return state
+
+    def structure(self):
+        """
+        Tree shape of the node list as four lists indexed like it:
+        the parent, the last node of the subtree, and the previous and
+        next node on the same level under the same parent (None when
+        there is none).  Built in a single pass with a stack of open
+        ancestors and kept until the nodes change.
+        """
+        if self._struct is None:
+            nodes   = self._nodes
+            count   = len(nodes)
+            parents = [None] * count
+            ends    = [count - 1] * count
+            prevs   = [None] * count
+            nexts   = [None] * count
+            levels  = [0] + [n._level for n in nodes[1:]]
+            stack   = [0] if count else []
+            for i in range(1, count):
+                level = levels[i]
+                while levels[stack[-1]] >= level:
+                    j = stack.pop()
+                    ends[j] = i - 1
+                    if levels[j] == level:
+                        prevs[i] = j
+                        nexts[j] = i
+                parents[i] = stack[-1]
+                stack.append(i)
+            self._struct = (parents, ends, prevs, nexts)
+        return self._struct
+
+    def start_rows(self):
+        """
+        Start rows of all the nodes in file order, or None if they are
+        not in order (in memory edits do not move the nodes after them).
+        """
+        if self._rows is None:
+            rows = [n._start for n in self._nodes]
+            if all(rows[i] <= rows[i + 1] for i in range(len(rows) - 1)):
+                self._rows = rows
+            else:
+                self._rows = False
+        return self._rows or None
+
     @property
     def targets(self):
+        if self._lazy:
+            self.parse_bodies()
         return self._targets
 
+    def _add_named(self, table, key, value, row):
+        # The bodies of a lazily parsed file are not parsed in file
+        # order, keep the entry furthest down like a full parse does.
+        old = table.get(key)
+        if old is not None and self._lazy:
+            oldRow = old['row'] if 'row' in old else old['loc'][0]
+            if oldRow > row:
+                return
+        table[key] = value
+
+    def _add_property_drawer(self, loc):
+        if self._lazy:
+            bisect.insort(self.properties, loc)
+        else:
+            self.properties.append(loc)
+
+    def parse_bodies(self):
+        """Parse the bodies of all the nodes that were left for later."""
+        for n in self._nodes[1:]:
+            n._ensure_body()
+
     @property
     def names(self):
+        if self._lazy:
+            self.parse_bodies()
         return self._names
     
     @property
@@ -415,14 +535,7 @@ class OrgBaseNode(Sequence):
 
     """
     def find_last_child_index(self):
-        level = self.level
-        start = self._index
-        end = start
-        for i in range(start+1, len(self.env._nodes)):
-            if(self.env._nodes[i]._level <= level):
-                break
-            end = i
-        return end
+        return self.env.structure()[1][self._index]
 
     def is_last_node(self):
         return (self.get_sibling_down() == None or self.get_sibling_down() == self)
@@ -433,6 +546,7 @@ class OrgBaseNode(Sequence):
         return defaultVal
    
     def set_comment(self, key, val):
+        self.env.edited()
         if not key in self._special_comments:
             self._lines.insert(0,"#+" + key + ": " + val)
             self._special_comments.setdefault(key, []).append(val)
@@ -461,11 +575,11 @@ class OrgBaseNode(Sequence):
 
     @property
     def targets(self):
-        return self.env._targets
+        return self.env.targets
 
     @property
     def names(self):
-        return self.env._names
+        return self.env.names
 
     def archive(self, defaultVal):
         dval = defaultVal
@@ -502,35 +616,22 @@ class OrgBaseNode(Sequence):
         return None
 
     def get_sibling_up(self):
-        i = self._index - 1
-        level = self._level
-        while(i > 0):
-            sibling = self.env._nodes[i]
-            if(sibling._level < level):
-                return None
-            if(sibling._level == level):
-                return sibling
-            i -= 1
-        # Return the root node
-        return None
+        i = self.env.structure()[2][self._index]
+        if(i is None):
+            return None
+        return self.env._nodes[i]
 
     def get_sibling_down(self):
-        i = self._index + 1
-        level = self._level
-        while(i < len(self.env._nodes)):
-            sibling = self.env._nodes[i]
-            if(sibling._level < level):
-                return None
-            if(sibling._level == level):
-                return sibling
-            i += 1
-        # Return the root node
-        return None
+        i = self.env.structure()[3][self._index]
+        if(i is None):
+            return None
+        return self.env._nodes[i]
 
 
     def insert_at(self, n, index):
         if(n == None):
             return
+        self.env.edited()
 
         if(type(n) is OrgRootNode):
             n = n.env._nodes[n._index+1] 
@@ -561,8 +662,9 @@ class OrgBaseNode(Sequence):
         pos    = index
         #pos = self._index
         count = 0
-        for cnode in n[0]:
+        for cnode in list(n[0]):
             count += 1
+            cnode._ensure_body()
             ccn    = copy.copy(cnode)
             self.env._nodes.insert(pos + count, ccn)
             ccn._level = ccn._level + ldif
@@ -574,17 +676,19 @@ class OrgBaseNode(Sequence):
             ccn._heading = ccn._lines[0]
             for i in range(1,len(ccn._lines)):
                 ccn._lines[i] = RE_INDENT_REPLACE.sub(indent, ccn._lines[i])
-        for i in range(pos + count, len(self.env._nodes)):
+        for i in range(pos + count + 1, len(self.env._nodes)):
             self.env._nodes[i]._index += count
         # Now setup my new nodes Env properly
         n.env = self.env
         # Reset the num_children count, we will recount again, just in case
         self._count = -1
+        self.env.invalidate()
 
 
     def insert_child(self, n):
         if(n == None):
             return None
+        self.env.edited()
 
         global RE_HEADER_REPLACE
         global RE_INDENT_REPLACE
@@ -606,8 +710,9 @@ class OrgBaseNode(Sequence):
         #pos = self._index
         retNode = None
         count = 0
-        for cnode in n[0]:
+        for cnode in list(n[0]):
             count += 1
+            cnode._ensure_body()
             ccn = copy.copy(cnode)
             self.env._nodes.insert(pos + count, ccn)
             if(count == 1):
@@ -645,16 +750,18 @@ class OrgBaseNode(Sequence):
             ccn._heading = ccn._lines[0]
             for i in range(1,len(ccn._lines)):
                 ccn._lines[i] = RE_INDENT_REPLACE.sub(indent, ccn._lines[i])
-        for i in range(pos + count, len(self.env._nodes)):
+        for i in range(pos + count + 1, len(self.env._nodes)):
             self.env._nodes[i]._index += count
         # Now setup my new nodes Env properly
         n.env = self.env
         # Reset the num_children count, we will recount again, just in case
         self._count = -1
+        self.env.invalidate()
         return retNode
 
     # Remove this node, and all its children!
     def remove_node(self):
+        self.env.edited()
         pos = self._index
         end = pos
         size = len(self.env._nodes)
@@ -674,9 +781,11 @@ class OrgBaseNode(Sequence):
         size = len(self.env._nodes)
         for i in range(pos,size):
             self.env._nodes[i]._index = i
+        self.env.invalidate()
 
     # NOTE: This will remove all children!
     def replace_node(self, n):
+        self.env.edited()
         if(type(n) is OrgRootNode):
             n = n.env._nodes[n._index+1]
         level = self.level
@@ -685,13 +794,17 @@ class OrgBaseNode(Sequence):
         pos = self._index
         count = 0
         self.remove_node()
-        for cnode in n[0]:
+        for cnode in list(n[0]):
+            cnode._ensure_body()
+            cnode = copy.copy(cnode)
             self.env._nodes.insert(pos + count, cnode)
             cnode._level = cnode._level + ldif
             cnode._index = pos + count
+            cnode.env    = self.env
             count += 1
         for i in range(pos + count, len(self.env._nodes)):
             self.env._nodes[i]._index += count
+        self.env.invalidate()
 
     def __init__(self, env, index=None):
         """
@@ -725,17 +838,16 @@ class OrgBaseNode(Sequence):
 
             """
 
+    # A node and its subtree are a contiguous run of env._nodes that ends
+    # at find_last_child_index. Iterating and slicing work on a copy of
+    # that run: reparse_lines splices env._nodes in place, and trees are
+    # walked off the main thread too.
+
     def __iter__(self):
-        yield self
-        level = self.level
-        for node in self.env._nodes[self._index + 1:]:
-            if node.level > level:
-                yield node
-            else:
-                break
+        return iter(self.env._nodes[self._index:self.find_last_child_index() + 1])
 
     def __len__(self):
-        return sum(1 for _ in self)
+        return self.find_last_child_index() - self._index + 1
 
     def __nonzero__(self):
         # As self.__len__ returns non-zero value always this is not
@@ -746,27 +858,20 @@ class OrgBaseNode(Sequence):
 
     def __getitem__(self, key):
         if isinstance(key, slice):
-            return itertools.islice(self, key.start, key.stop, key.step)
+            return self.env._nodes[self._index:self.find_last_child_index() + 1][key]
         elif isinstance(key, int):
+            size = len(self)
             if key < 0:
-                key += len(self)
-            for (i, node) in enumerate(self):
-                if i == key:
-                    return node
-            raise IndexError("Out of range {0}".format(key))
+                key += size
+            if key < 0 or key >= size:
+                raise IndexError("Out of range {0}".format(key))
+            return self.env._nodes[self._index + key]
         else:
             raise TypeError("Inappropriate type {0} for {1}"
                             .format(type(key), type(self)))
 
     # tree structure
 
-    def _find_same_level(self, iterable):
-        for node in iterable:
-            if node.level < self.level:
-                return
-            if node.level == self.level:
-                return node
-
     @property
     def start_row(self):
         return self._start
@@ -774,15 +879,6 @@ class OrgBaseNode(Sequence):
     def size(self):
         return self._end - self._start
 
-    @property
-    def end_row(self):
-        end = self._end
-        midx = self._index
-        idx  = self.find_last_child_index()
-        if(midx != idx):
-            end = self.env._nodes[idx].end_row
-        return end
-
     @property
     def local_end_row(self):
         return self._end
@@ -807,12 +903,7 @@ class OrgBaseNode(Sequence):
 
     @property
     def end_row(self):
-        end = self._end
-        midx = self._index
-        idx  = self.find_last_child_index()
-        if(midx != idx):
-            end = self.env._nodes[idx].end_row
-        return end
+        return self.env._nodes[self.find_last_child_index()]._end
 
     @property
     def previous_same_level(self):
@@ -834,7 +925,7 @@ class OrgBaseNode(Sequence):
         True
 
         """
-        return self._find_same_level(reversed(self.env._nodes[:self._index]))
+        return self.get_sibling_up()
 
     @property
     def next_same_level(self):
@@ -856,13 +947,13 @@ class OrgBaseNode(Sequence):
         True
 
         """
-        return self._find_same_level(self.env._nodes[self._index + 1:])
+        return self.get_sibling_down()
 
-    # FIXME: cache parent node
     def _find_parent(self):
-        for node in reversed(self.env._nodes[:self._index]):
-            if node.level < self.level:
-                return node
+        i = self.env.structure()[0][self._index]
+        if i is None:
+            return None
+        return self.env._nodes[i]
 
     def get_parent(self, max_level=None):
         """
@@ -947,23 +1038,15 @@ class OrgBaseNode(Sequence):
         Alias of :meth:`get_parent()` (calling without argument).
         """
         return self.get_parent()
-    # FIXME: cache children nodes
     def _find_children(self):
-        nodeiter = iter(self.env._nodes[self._index + 1:])
-        try:
-            node = next(nodeiter)
-        except StopIteration:
-            return
-        if node.level <= self.level:
-            return
-        yield node
-        last_child_level = node.level
-        for node in nodeiter:
-            if node.level <= self.level:
-                return
-            if node.level <= last_child_level:
-                yield node
-                last_child_level = node.level
+        # Each child is the node right after the subtree of the one before.
+        ends  = self.env.structure()[1]
+        nodes = self.env._nodes
+        last  = ends[self._index]
+        i = self._index + 1
+        while i <= last:
+            yield nodes[i]
+            i = ends[i] + 1
 
     @property
     def num_children(self):
@@ -975,15 +1058,7 @@ class OrgBaseNode(Sequence):
                         self._count += 1
             return self._count
 
-        if(self._count == -1):
-            self._count = 0
-            idx   = self._index + 1
-            level = self._level
-            for i in range(self._index + 1, len(self.env._nodes)):
-                if(self.env._nodes[i]._level <= level):
-                    return self._count
-                self._count += 1
-        return self._count
+        return self.find_last_child_index() - self._index
 
     @property
     def children(self):
@@ -1173,9 +1248,15 @@ class OrgRootNode(OrgBaseNode):
         return True
 
     def at(self, line):
-        for n in self.env._nodes:
-            if(n.is_in(line)):
-                return n
+        rows = self.env.start_rows()
+        if(rows is None):
+            for n in self.env._nodes:
+                if(n.is_in(line)):
+                    return n
+            return None
+        i = bisect.bisect_right(rows, line) - 1
+        if(i >= 0 and self.env._nodes[i].is_in(line)):
+            return self.env._nodes[i]
         return None
 
     def node_at(self, index):
@@ -1189,6 +1270,13 @@ class OrgRootNode(OrgBaseNode):
     def setFile(self, file):
         self.file = file
 
+    # The owning FileInfo is not part of the parse result
+    # and is reattached when the tree is restored.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('file', None)
+        return state
+
 RE_PROTO = re.compile(r"^[a-zA-Z][a-zA-Z]+[:]")
 class OrgLink:
     def __init__(self, text, link, desc, row, linktext):
@@ -1210,7 +1298,14 @@ class OrgLink:
             return False
         return not RE_PROTO.search(self.link)
 
+    # fromFile is filled in by the db when backlinks are built.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('fromFile', None)
+        return state
+
 
+_LAZY_BODY_LOCK = threading.Lock()
 
 class OrgNode(OrgBaseNode):
 
@@ -1228,24 +1323,46 @@ class OrgNode(OrgBaseNode):
         self._tags = None
         self._todo = None
         self._priority = None
+        self._scheduled = OrgDate(None)
+        self._deadline = OrgDate(None)
+        self._closed = OrgDate(None)
+        self._customid = None
+        self._id = None
+        self._body_parsed = True
+        self._reset_body()
+
+    # Attributes filled in by _parse_body. In lazy mode they are left
+    # out of the instance until one of them is asked for.
+    _BODY_ATTRS = (
+        '_properties', '_property_offsets', '_drawers', '_blocks',
+        '_dynamicblocks', '_property_drawer_location', '_timestamps',
+        '_clocklist', '_body_lines', '_repeated_tasks', '_body_lines_start',
+        '_table')
+
+    def _reset_body(self):
         self._properties = {}
         self._property_offsets = {}
         self._drawers = None
         self._blocks = None
         self._dynamicblocks = None
         self._property_drawer_location = None
-        self._scheduled = OrgDate(None)
-        self._deadline = OrgDate(None)
-        self._closed = OrgDate(None)
         self._timestamps = []
         self._clocklist = []
         self._body_lines = []
         self._repeated_tasks = []
         self._body_lines_start = None
-        self._customid = None
-        self._id = None
         self._table = None
 
+    def __getattr__(self, name):
+        # Only called for missing attributes, which for a lazy
+        # node means its body has not been parsed yet.
+        if name in OrgNode._BODY_ATTRS:
+            # Another thread may have just parsed it.
+            self._parse_lazy_body()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(name)
+
     @property
     def customid(self):
         return self._customid
@@ -1298,29 +1415,85 @@ class OrgNode(OrgBaseNode):
     def _parse_pre(self):
         """Call parsers which must be called before tree structuring"""
         self._parse_heading()
-        # FIXME: make the following parsers "lazy"
+        if self.env._lazy:
+            self._parse_sdc()
+            self._prescan_body()
+            for name in OrgNode._BODY_ATTRS:
+                self.__dict__.pop(name, None)
+            self._body_parsed = False
+        else:
+            self._parse_body()
+
+    def _parse_sdc(self):
+        """Parse just the SCHEDULED, DEADLINE and CLOSED lines.
+
+        Returns the offset of the first line after them."""
         ilines = OffsetIter(self._lines)
-        #try:
-        #    next(ilines)            # skip heading
-        #except StopIteration:
-        #    return
-        # This is creative each parser gets a crack at
-        # each line. The problem is that we can't
-        # tell the offset from the heading
-        gen = self._iparse_sdc(ilines)
-        gen = self._iparse_links(gen, ilines)
-        gen = self._iparse_names(gen, ilines)
-        gen = self._iparse_clock(gen, ilines)
-        gen = self._iparse_tables(gen, ilines)
-        gen = self._iparse_properties(gen, ilines)
-        gen = self._iparse_drawers(gen, ilines)
-        gen = self._iparse_targets(gen, ilines)
-        gen = self._iparse_blocks(gen, ilines)
-        gen = self._iparse_repeated_tasks(gen, ilines)
-        gen = self._iparse_timestamps(gen, ilines)
-        if(self._body_lines_start == None):
-            self._body_lines_start = self._start + ilines.offset + 1
-        self._body_lines = list(gen)
+        next(self._iparse_sdc(ilines), None)
+        return ilines.offset
+
+    def _prescan_body(self):
+        """
+        Fill in the file wide id and link tables for a node whose body
+        is parsed later. Only looks at lines that can hold a link or
+        the first property drawer, which is far cheaper than parsing.
+        """
+        lines = self._lines
+        first = self._parse_sdc()
+        for offset in range(first, len(lines)):
+            line = lines[offset]
+            if '[[' in line:
+                for m in RE_LINK.finditer(line):
+                    row = self._start + offset
+                    self.env._links.append(OrgLink(line, m.group('link'), m.group('desc'), row, m.group()))
+        in_property_field = False
+        for offset in range(first, len(lines)):
+            line = lines[offset]
+            if in_property_field:
+                if line.find(":END:") >= 0:
+                    break
+                (key, val) = parse_property(line)
+                if key:
+                    if (key.lower() == "custom_id"):
+                        self._customid = (val, offset)
+                        self.env.customids[val] = (offset, self._start)
+                    if (key.lower() == "id"):
+                        self._id = (val, offset)
+                        self.env.ids[val] = (offset, self._start)
+            elif line.find(":PROPERTIES:") >= 0:
+                in_property_field = True
+
+    def _ensure_body(self):
+        if not self.__dict__.get('_body_parsed', True):
+            self._parse_lazy_body()
+
+    def _parse_lazy_body(self):
+        # The agenda precomputes on a thread of its own, the body can be
+        # asked for from two threads at once. It is parsed on a copy and
+        # put in place in one go so nobody sees a half parsed body.
+        with _LAZY_BODY_LOCK:
+            if self.__dict__.get('_body_parsed', True):
+                return
+            shadow = object.__new__(type(self))
+            shadow.__dict__.update(self.__dict__)
+            shadow._parse_body()
+            body = dict((name, shadow.__dict__[name])
+                        for name in OrgNode._BODY_ATTRS if name in shadow.__dict__)
+            body['_body_parsed'] = True
+            self.__dict__.update(body)
+
+    def _parse_body(self):
+        # A prescanned node already has its ids and links in the env
+        # and its dates parsed, which may since have been handed out.
+        prescanned = not self.__dict__.get('_body_parsed', True)
+        self._body_parsed = True
+        dates = (self._scheduled, self._deadline, self._closed)
+        self._reset_body()
+        first = self._parse_sdc()
+        self._body_lines_start = self._start + 1
+        self._parse_body_lines(first, links=not prescanned)
+        if prescanned:
+            (self._scheduled, self._deadline, self._closed) = dates
 
     def _parse_heading(self):
         heading = self._lines[0]
@@ -1331,12 +1504,6 @@ class OrgNode(OrgBaseNode):
         (heading, self._priority) = parse_heading_priority(heading)
         self._heading = heading
 
-    # The following ``_iparse_*`` methods are simple generator based
-    # parser.  See ``_parse_pre`` for how it is used.  The principle
-    # is simple: these methods get an iterator and returns an iterator.
-    # If the item returned by the input iterator must be dedicated to
-    # the parser, do not yield the item or yield it as-is otherwise.
-
     def _iparse_sdc(self, ilines):
         """
         Parse SCHEDULED, DEADLINE and CLOSED time tamps.
@@ -1356,6 +1523,7 @@ class OrgNode(OrgBaseNode):
                     deadline or
                     closed):
                 yield line  # when none of them were found
+                break
             else:
                 if(scheduled):
                     self._scheduled = scheduled
@@ -1371,201 +1539,195 @@ class OrgNode(OrgBaseNode):
         for line in ilines:
             yield line
 
-    def _iparse_clock(self, ilines, at):
-        self._clocklist = clocklist = []
-        for line in ilines:
-            try:
-                cl = OrgDateClock.from_str(line)
-            except:
-                print("FAILED PARSING CLOCK({0}): {1}".format(at.offset,line))
-            if cl:
-                clocklist.append(cl)
-            else:
-                yield line
-
-    def _iparse_timestamps(self, ilines, at):
-        self._timestamps = timestamps = []
-        timestamps.extend(OrgDate.list_from_str(self._heading))
-        for l in ilines:
-            timestamps.extend(OrgDate.list_from_str(l))
-            yield l
-
-    def _iparse_names(self, ilines, at):
-        for l in ilines:
-            parsed = parse_comment(l)
-            if parsed:
-                (key, val) = parsed
-                if(key == 'NAME' or key == 'name'):
-                    self.lastName = val
-            yield l
-
-    def _iparse_tables(self, ilines, at):
+    def _parse_body_lines(self, first, links=True):
+        """
+        Sort every body line from ``first`` on into clocks, tables,
+        properties, drawers, targets, blocks, repeated tasks and
+        timestamps in one pass. What is left over are the body lines.
+
+        Each line is checked for the characters a construct can not
+        do without before any regular expression is run on it. Lines
+        that belong to a clock, the property drawer, a drawer, a block
+        or a repeated task are not looked at any further.
+        """
+        env   = self.env
+        start = self._start
+        lines = self._lines
+        body  = []
+        clocklist = []
+        repeated_tasks = []
+        properties = {}
+        poff = {}
+        drawers = []
+        blocks = []
+        dynamicblocks = []
+        timestamps = OrgDate.list_from_str(self._heading)
+        # Only the first property drawer is read.
+        props_state = 0     # 0 looking, 1 inside, 2 done
+        props_start = 0
+        in_drawer = False
+        drawer_name = ""
+        drawer_start = 0
+        in_block = False
+        in_dynamic_block = False
+        block_start = 0
         in_table = False
-        start = None
-        localStart = None
-        for l in ilines:
-            m = RE_TABLE_MATCH.match(l)
-            if(m):
-                if(not start):
-                    localStart = at.offset
-                    start = self._start + localStart
+        table_start = None
+        table_offset = None
+        for offset in range(first, len(lines)):
+            line = lines[offset]
+            row  = start + offset
+            if links and '[[' in line:
+                for m in RE_LINK.finditer(line):
+                    env._links.append(OrgLink(line, m.group('link'), m.group('desc'), row, m.group()))
+            keyword = '#+' in line
+            if keyword:
+                parsed = parse_comment(line)
+                if parsed and (parsed[0] == 'NAME' or parsed[0] == 'name'):
+                    self.lastName = parsed[1]
+            if ']--' in line:
+                try:
+                    cl = OrgDateClock.from_str(line)
+                except:
+                    print("FAILED PARSING CLOCK({0}): {1}".format(offset,line))
+                    cl = None
+                if cl:
+                    clocklist.append(cl)
+                    continue
+            if '|' in line and RE_TABLE_MATCH.match(line):
+                # NOTE: Like before, later tables start where the first did.
+                if(not table_start):
+                    table_offset = offset
+                    table_start = start + offset
                 in_table = True
-            else:
-                if(in_table):
-                    in_table = False
-                    localEnd = at.offset
-                    end = self._start + localEnd
-                    name = ""
-                    if(self.lastName):
-                        name = self.lastName
-                        self.env.NamedObjects[self.lastName] = {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd), "name": self.lastName}
-                        self.lastName = None
-                    if(None == self._table):
-                        self._table = {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd),"name": name}
-            yield l
-        if(in_table):
-            in_table = False
-            localEnd = at.offset
-            end = self._start + localEnd
-            name = ""
-            if(self.lastName):
-                name = self.lastName
-                self.env.NamedObjects[self.lastName] = {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd), "name": self.lastName}
-                self.lastName = None
-            if(None == self._table):
-                self._table = {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd), "name": name}
-
-    def _iparse_properties(self, ilines, at):
-        self._properties = properties = {}
-        self._property_offsets = poff = {}
-        in_property_field = False
-        start = 0
-        end   = 0
-        for line in ilines:
-            if in_property_field:
+            elif in_table:
+                in_table = False
+                self._add_table(table_start, table_offset, offset)
+            if props_state == 1:
                 if line.find(":END:") >= 0:
-                    end = self._start + at.offset
-                    self._property_drawer_location = (start, end)
-                    self.env.properties.append(self._property_drawer_location)
-                    in_property_field = False
-                    break
+                    self._property_drawer_location = (props_start, row)
+                    env._add_property_drawer(self._property_drawer_location)
+                    props_state = 2
                 else:
                     (key, val) = parse_property(line)
                     if key:
-                        properties.update({key: val})
+                        properties[key] = val
                         if (key.lower() == "custom_id"):
-                            self._customid = (val, at.offset)
-                            self.env.customids[val] = (at.offset, self._start)
+                            self._customid = (val, offset)
+                            if links:
+                                env.customids[val] = (offset, start)
                         if (key.lower() == "id"):
-                            self._id = (val, at.offset)
-                            self.env.ids[val] = (at.offset, self._start)
-                        poff.update({key: at.offset})
-            elif line.find(":PROPERTIES:") >= 0:
-                start = self._start + at.offset
-                in_property_field = True
-            else:
-                yield line
-        for line in ilines:
-            yield line
-    
-    def _iparse_links(self, ilines, at):
-        #self.env._links
-        RE_LINK = re.compile(r"\[\[(?P<link>[^\]]+)\](\[(?P<desc>[^\]]+)\])?\]")
-        for line in ilines:
-            for m in RE_LINK.finditer(line):
-                row = self._start + at.offset
-                link = OrgLink(line, m.group('link'), m.group('desc'), row, m.group())
-                self.env._links.append(link)
-            yield line
-
-    def _iparse_drawers(self, ilines, at):
-        self._drawers = []
-        drawerName = ""
-        in_field = False
-        start    = 0
-        end      = 0
-        for line in ilines:
-            m = RE_DRAWER.search(line)
-            if in_field:
+                            self._id = (val, offset)
+                            if links:
+                                env.ids[val] = (offset, start)
+                        poff[key] = offset
+                continue
+            if props_state == 0 and line.find(":PROPERTIES:") >= 0:
+                props_start = row
+                props_state = 1
+                continue
+            if in_drawer:
                 if line.find(":END:") >= 0:
-                    end = self._start + at.offset
-                    loc = (start, end)
-                    drw = { "name":drawerName, "loc":loc }
-                    self._drawers.append(drw)
-                    in_field = False
-            elif m != None and m.group(1) != "PROPERTIES" and m.group(1) != "END":
-                drawerName = m.group(1)
-                start      = self._start + at.offset
-                in_field   = True
-            else:
-                yield line
-        for line in ilines:
-            yield line
-
-    def _iparse_blocks(self, ilines, at):
-        self._blocks = []
-        self._dynamicblocks = []
-        in_block = False
-        in_dynamic_block = False
-        start = 0
-        end   = 0
-        for line in ilines:
+                    drawers.append({ "name":drawer_name, "loc":(drawer_start, row) })
+                    in_drawer = False
+                continue
+            if ':' in line:
+                m = RE_DRAWER.search(line)
+                if m != None and m.group(1) != "PROPERTIES" and m.group(1) != "END":
+                    drawer_name  = m.group(1)
+                    drawer_start = row
+                    in_drawer    = True
+                    continue
+            if '<<' in line:
+                m = RE_TARGETS.search(line)
+                if(m):
+                    name = m.group('target')
+                    col  = m.span('target')
+                    env._add_named(env._targets, name, {'row': row, 'col': col[0] + 1}, row)
             if in_block:
-                if line.find("#+END_") >= 0 or line.find("#+end_") >= 0:
-                    end = self._start + at.offset
-                    blk = (start, end)
+                if keyword and (line.find("#+END_") >= 0 or line.find("#+end_") >= 0):
+                    blk = (block_start, row)
                     if(self.lastName):
-                        self.env.NamedObjects[self.lastName] = {"type": "b", "loc": blk}
+                        env._add_named(env.NamedObjects, self.lastName, {"type": "b", "loc": blk}, block_start)
                         self.lastName = None
-                    self._blocks.append(blk)
+                    blocks.append(blk)
                     in_block = False
-            elif in_dynamic_block:
-                if line.find("#+END:") >= 0 or line.find("#+end:") >= 0:
-                    end = self._start + at.offset
-                    blk = (start, end)
+                continue
+            if in_dynamic_block:
+                if keyword and (line.find("#+END:") >= 0 or line.find("#+end:") >= 0):
+                    blk = (block_start, row)
                     if(self.lastName):
-                        self.env.NamedObjects[self.lastName] = {"type": "db", "loc": blk}
+                        env._add_named(env.NamedObjects, self.lastName, {"type": "db", "loc": blk}, block_start)
                         self.lastName = None
-                    self._dynamicblocks.append(blk)
+                    dynamicblocks.append(blk)
                     in_dynamic_block = False
-            elif line.find("#+BEGIN_") >= 0 or line.find("#+begin_") >= 0:
-                start = self._start + at.offset
-                in_block = True
-            elif line.find("#+BEGIN:") >= 0 or line.find("#+begin:") >= 0:
-                start = self._start + at.offset
-                in_dynamic_block = True
-            else:
-                yield line
-        for line in ilines:
-            yield line
-
-    def _iparse_targets(self, ilines, at):
-        global RE_TARGETS
-        if(not hasattr(self.env,'_targets')):
-            self.env._targets = {}
-        for line in ilines:
-            m = RE_TARGETS.search(line)
-            if(m):
-                name = m.group('target')
-                row  = self._start + at.offset
-                col  = m.span('target')
-                self.env._targets[name] = {'row': row, 'col': col[0] + 1}
-            yield line
-
-    def _iparse_repeated_tasks(self, ilines, at):
-        self._repeated_tasks = repeated_tasks = []
-        for line in ilines:
-            match = self._repeated_tasks_re.search(line)
-            if match:
-                # FIXME: move this parsing to OrgDateRepeatedTask.from_str
-                mdict = match.groupdict()
-                done_state = mdict['done']
-                todo_state = mdict['todo']
-                date = OrgDate.from_str(mdict['date'])
-                repeated_tasks.append(
-                    OrgDateRepeatedTask(date.start, todo_state, done_state))
-            else:
-                yield line
+                continue
+            if keyword:
+                if line.find("#+BEGIN_") >= 0 or line.find("#+begin_") >= 0:
+                    block_start = row
+                    in_block = True
+                    continue
+                if line.find("#+BEGIN:") >= 0 or line.find("#+begin:") >= 0:
+                    block_start = row
+                    in_dynamic_block = True
+                    continue
+            if 'State' in line:
+                match = self._repeated_tasks_re.search(line)
+                if match:
+                    # FIXME: move this parsing to OrgDateRepeatedTask.from_str
+                    mdict = match.groupdict()
+                    date = OrgDate.from_str(mdict['date'])
+                    repeated_tasks.append(
+                        OrgDateRepeatedTask(date.start, mdict['todo'], mdict['done']))
+                    continue
+            if '<' in line or '[' in line:
+                timestamps.extend(OrgDate.list_from_str(line))
+            body.append(line)
+        if(in_table):
+            self._add_table(table_start, table_offset, len(lines))
+        self._clocklist = clocklist
+        self._repeated_tasks = repeated_tasks
+        self._properties = properties
+        self._property_offsets = poff
+        self._drawers = drawers
+        self._blocks = blocks
+        self._dynamicblocks = dynamicblocks
+        self._timestamps = timestamps
+        self._body_lines = body
+
+    def _add_table(self, start, localStart, localEnd):
+        end = self._start + localEnd
+        name = ""
+        if(self.lastName):
+            name = self.lastName
+            self.env._add_named(self.env.NamedObjects, self.lastName, {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd), "name": self.lastName}, start)
+            self.lastName = None
+        if(None == self._table):
+            self._table = {"type": "t", "loc": (start, end), "nodeoff": (localStart,localEnd), "name": name}
+
+    def _shift_rows(self, delta):
+        """Move every absolute row this node knows about by ``delta``."""
+        def shift(loc):
+            return (loc[0] + delta, loc[1] + delta)
+        self._start += delta
+        self._end   += delta
+        if not self._body_parsed:
+            # Parsed from the new rows when it is first asked for.
+            return
+        if self._body_lines_start is not None:
+            self._body_lines_start += delta
+        if self._property_drawer_location:
+            self._property_drawer_location = shift(self._property_drawer_location)
+        if self._drawers:
+            for drw in self._drawers:
+                drw['loc'] = shift(drw['loc'])
+        if self._blocks:
+            self._blocks = [shift(blk) for blk in self._blocks]
+        if self._dynamicblocks:
+            self._dynamicblocks = [shift(blk) for blk in self._dynamicblocks]
+        if self._table:
+            self._table = dict(self._table)
+            self._table['loc'] = shift(self._table['loc'])
 
     _repeated_tasks_re = re.compile(
         r'''
@@ -1690,6 +1852,7 @@ class OrgNode(OrgBaseNode):
 
 
     def add_tag(self, tag):
+        self.env.edited()
         if(not tag in self._tags):
             self._tags.append(tag)
             head = self._lines[0].strip()
@@ -1721,6 +1884,7 @@ class OrgNode(OrgBaseNode):
         return self._todo
 
     def update_property(self, key, val):
+        self.env.edited()
         # Do we have this property already?
         if(not key in self._properties):
             self._properties[key] = val
@@ -2009,8 +2173,22 @@ class OrgNode(OrgBaseNode):
         return self._repeated_tasks
 
 
-def parse_lines(lines, filename, todos, dones):
+def emit_tags(root):
+    """
+    Announce the tags of a tree that was not parsed in this process
+    (restored from disk or parsed by a worker), the same way
+    :func:`parse_heading_tags` does while parsing.
+    """
+    tags = set()
+    for n in root.env._nodes[1:]:
+        tags.update(n._tags)
+    if tags:
+        evt.Get().emit("tagsfound", list(tags))
+
+
+def parse_lines(lines, filename, todos, dones, lazy=False):
     env = OrgEnv(filename=filename, todos=todos, dones=dones)
+    env._lazy = lazy
     # parse into node of list (environment will be parsed)
     nodelist = list(env.from_chunks(lines_to_chunks(lines)))
     # parse headings (level, TODO, TAGs, and heading)
@@ -2019,5 +2197,139 @@ def parse_lines(lines, filename, todos, dones):
         node._index = i
         node._parse_pre()
     env._nodes = nodelist
+    env.invalidate()
+    env.structure()
     return nodelist[0]  # root
 
+
+def _is_todo_comment(line):
+    if '#+' not in line:
+        return False
+    parsed = parse_comment(line)
+    return bool(parsed) and parsed[0] in ('TODO', 'SEQ_TODO', 'TYP_TODO')
+
+
+def _rebase_env(env, start, end, delta):
+    """
+    Forget what rows ``start`` to ``end`` contributed to the file wide
+    tables and move everything that comes after them by ``delta``.
+
+    Returns the moved table entries. Like in a full parse the entries
+    further down the file have to win over the ones parsed again, so
+    they are put back once the changed rows have been parsed.
+    """
+    later = []
+    def rebase(table, getrow, setrow):
+        moved = {}
+        for key in list(table.keys()):
+            row = getrow(table[key])
+            if row > end:
+                table[key] = moved[key] = setrow(table[key], row + delta)
+            elif row >= start:
+                del table[key]
+        later.append((table, moved))
+    rebase(env.customids, lambda v: v[1], lambda v, row: (v[0], row))
+    rebase(env.ids, lambda v: v[1], lambda v, row: (v[0], row))
+    rebase(env._targets, lambda v: v['row'], lambda v, row: dict(v, row=row))
+    rebase(env._names, lambda v: v['row'], lambda v, row: dict(v, row=row))
+    rebase(env.NamedObjects, lambda v: v['loc'][0],
+        lambda v, row: dict(v, loc=(row, v['loc'][1] + delta)))
+    links = []
+    for link in env._links:
+        if link.row > end:
+            link.row += delta
+        elif link.row >= start:
+            continue
+        links.append(link)
+    env._links = links
+    props = []
+    for loc in env.properties:
+        if loc[0] > end:
+            loc = (loc[0] + delta, loc[1] + delta)
+        elif loc[0] >= start:
+            continue
+        props.append(loc)
+    env.properties = props
+    return later
+
+
+def reparse_lines(root, old, new):
+    """
+    Bring a tree parsed from the lines ``old`` up to date with ``new``
+    by parsing only the nodes that contain changed lines.
+
+    The nodes after the change are moved rather than parsed again.
+    Returns False when the change can not be applied this way (it
+    touches the file header or TODO keyword definitions, or the tree
+    was edited in memory), the caller has to parse ``new`` from
+    scratch in that case.
+    """
+    env   = root.env
+    nodes = env._nodes
+    oldLen = len(old)
+    newLen = len(new)
+    count  = min(oldLen, newLen)
+    # Rows before a and the last b rows are the same in both versions.
+    a = 0
+    while a < count and old[a] == new[a]:
+        a += 1
+    if a == oldLen and a == newLen:
+        return True
+    b = 0
+    while b < count - a and old[oldLen - b - 1] == new[newLen - b - 1]:
+        b += 1
+    if oldLen == 0 or len(nodes) < 2 or env._edited:
+        return False
+    delta = newLen - oldLen
+    first = min(a, oldLen - 1)
+    last  = min(max(a, oldLen - b - 1), oldLen - 1)
+    starts = env.start_rows()
+    if starts is None:
+        return False
+    firstIdx = bisect.bisect_right(starts, first) - 1
+    lastIdx  = bisect.bisect_right(starts, last) - 1
+    # Lines added at the very top of a node may belong to the body of
+    # the node before it.
+    if firstIdx > 1 and a == nodes[firstIdx]._start:
+        firstIdx -= 1
+    if firstIdx < 1:
+        return False
+    start  = nodes[firstIdx]._start
+    oldEnd = nodes[lastIdx]._end
+    newEnd = oldEnd + delta
+    if newEnd >= start and not RE_NODE_HEADER.search(new[start]):
+        return False
+    if any(_is_todo_comment(l) for l in itertools.chain(old[start:oldEnd + 1], new[start:newEnd + 1])):
+        return False
+
+    later = _rebase_env(env, start, oldEnd, delta)
+    chunks = lines_to_chunks(new[start:newEnd + 1])
+    next(chunks)    # nothing comes before the first heading
+    nodelist = []
+    for (lines, s, e) in chunks:
+        nodelist.append(OrgNode.from_chunk(env, (lines, s + start, e + start)))
+    nodes[firstIdx:lastIdx + 1] = nodelist
+    for (i, node) in enumerate(nodelist, firstIdx):
+        node._index = i
+        node._parse_pre()
+    for (table, moved) in later:
+        table.update(moved)
+    after = firstIdx + len(nodelist)
+    for i in range(after, len(nodes)):
+        node = nodes[i]
+        node._index = i
+        if delta:
+            node._shift_rows(delta)
+    # The nodes before the change may be its ancestors, their
+    # cached counts and durations no longer hold.
+    for node in nodes[:firstIdx]:
+        node._count = -1
+        if hasattr(node, '_local_duration'):
+            del node._local_duration
+            del node._total_duration
+    # Keep the file wide lists in file order, like a full parse does.
+    env._links.sort(key=lambda link: link.row)
+    env.properties.sort()
+    env.invalidate()
+    return True
+
@@ -0,0 +1,103 @@
+import logging
+import collections
+
+log = logging.getLogger(__name__)
+
+
+# Which formula cells read which cells of a table.
+#
+# Every formula target cell has the rectangles of cells its formula
+# reads, (firstRow, lastRow, firstCol, lastCol). They are kept by
+# column so the cells reading a given cell can be found without going
+# through every target. A target whose references could not be worked
+# out reads everything, see Affected.
+class CellDependencyGraph:
+    def __init__(self):
+        self.reads    = {}
+        self.byCol    = {}
+        self.readsAll = set()
+
+    def __len__(self):
+        return len(self.reads)
+
+    def Add(self, target, rects):
+        self.reads[target] = rects
+        for rect in rects:
+            r1, r2, c1, c2 = rect
+            for c in range(c1, c2 + 1):
+                self.byCol.setdefault(c, []).append((r1, r2, target))
+
+    def AddReadsAll(self, target):
+        self.reads[target] = None
+        self.readsAll.add(target)
+
+    def IsTarget(self, cell):
+        return cell in self.reads
+
+    # The targets with static reads reading cell, never cell itself.
+    # Targets reading everything are left to Affected.
+    def ReadersOf(self, cell):
+        r, c = cell
+        readers = set()
+        for r1, r2, target in self.byCol.get(c, ()):
+            if(r >= r1 and r <= r2):
+                readers.add(target)
+        readers.discard(cell)
+        return readers
+
+    # The targets to recompute after cells changed: the changed cells
+    # that are targets themselves and every target reading one of them,
+    # directly or through other targets.
+    #
+    # Returns (order, cyclic). order has every target after the targets
+    # it reads. cyclic has the targets that are part of, or read from,
+    # a circular reference, they have no order to be computed in.
+    #
+    # Targets reading everything would read each other, they only
+    # depend on the changed cells and the targets with static reads and
+    # come after those, in table order. Then the targets reading them.
+    def Affected(self, cells):
+        cells = [cell for cell in cells if cell not in self.readsAll]
+        order, cyclic = self.Ordered(cells, [cell for cell in cells if cell in self.reads])
+        if(self.readsAll):
+            readsAll = sorted(self.readsAll)
+            after, afterCyclic = self.Ordered(readsAll, [])
+            # Whatever reads them is only computed once, after them.
+            later  = set(after) | set(afterCyclic)
+            order  = [t for t in order if t not in later] + readsAll + after
+            cyclic = sorted(set(t for t in cyclic if t not in later) | set(afterCyclic))
+        if(cyclic):
+            log.warning("Circular cell references in table: {0}".format(cyclic))
+        return (order, cyclic)
+
+    # The targets in include and the targets with static reads reading
+    # one of cells, directly or through other such targets. Returns
+    # (order, cyclic) like Affected.
+    def Ordered(self, cells, include):
+        affected = set(include)
+        readers  = {}
+        todo     = collections.deque(cells)
+        seen     = set(cells)
+        while todo:
+            cell = todo.popleft()
+            readers[cell] = self.ReadersOf(cell)
+            for target in readers[cell]:
+                affected.add(target)
+                if(target not in seen):
+                    seen.add(target)
+                    todo.append(target)
+        pending = dict((target, 0) for target in affected)
+        for target in affected:
+            for reader in readers[target]:
+                pending[reader] += 1
+        ready = collections.deque(sorted(t for t in affected if pending[t] == 0))
+        order = []
+        while ready:
+            target = ready.popleft()
+            order.append(target)
+            for reader in sorted(readers[target]):
+                pending[reader] -= 1
+                if(pending[reader] == 0):
+                    ready.append(reader)
+        cyclic = sorted(t for t in affected if pending[t] > 0)
+        return (order, cyclic)
@@ -20,6 +20,8 @@ import OrgExtended.orgparse.date as orgdate
 import OrgExtended.orgduration as orgduration
 import OrgExtended.orgtableplot as orgplot
 import OrgExtended.orglinks as olinks
+import OrgExtended.orgtablegrid as grid
+import OrgExtended.orgtabledeps as deps
 import math
 import random
 import ast
@@ -680,6 +682,47 @@ def formula_sources(expr):
             matches.append([row,col])
     return matches
 
+# Functions a formula reads cells of this table through.
+REFERENCE_FUNCTIONS = ('getcell', 'getrowcell', 'getcolcell', 'symorcell')
+
+def isReference(node):
+    return isinstance(node,ast.Call) and isinstance(node.func,ast.Name) and node.func.id in REFERENCE_FUNCTIONS
+
+# Reference arguments that only depend on the target cell.
+def isStaticReferenceArg(node):
+    if(isinstance(node,ast.UnaryOp) and isinstance(node.op,(ast.USub,ast.UAdd))):
+        node = node.operand
+    if(isinstance(node,ast.Call)):
+        return isinstance(node.func,ast.Name) and node.func.id in ('ridx','cidx') and not node.args and not node.keywords
+    return type(node).__name__ in ('Num','Str','Constant')
+
+# The cell references in an expression that has been through
+# replace_cell_references. Each one is a list of the compiled cell
+# references, one for a cell, two for a range. None if a reference
+# cannot be worked out without evaluating the formula.
+# The references remote() is given are cells of another table.
+def formula_references(expr):
+    refs = []
+    skip = set()
+    for node in ast.walk(ast.parse(expr.strip())):
+        if(id(node) in skip):
+            continue
+        if(isinstance(node,ast.Call) and isinstance(node.func,ast.Name) and node.func.id == 'remote'):
+            skip.update(id(n) for n in ast.walk(node))
+            continue
+        if(isinstance(node,ast.BinOp) and isinstance(node.op,ast.FloorDiv) and isReference(node.left) and isReference(node.right)):
+            parts = [node.left, node.right]
+        elif(isReference(node)):
+            parts = [node]
+        else:
+            continue
+        for part in parts:
+            if(part.keywords or not all(isStaticReferenceArg(a) for a in part.args)):
+                return None
+            skip.update(id(n) for n in ast.walk(part))
+        refs.append([simpev.compile_node(part) for part in parts])
+    return refs
+
 # ============================================================
 class Formula:
     def __init__(self,raw, expr, reg, formatters, table):
@@ -744,6 +787,114 @@ def CellBoxIterator(table,a,b):
             cell = Cell(r,c,table)
             yield cell
 
+# What a range like @2..@-1 evaluates to, the cells of rows by cols.
+# Iterating it gives a Cell for each of them, row by row, like the
+# iterators above. The range functions read the whole range from the
+# table a column at a time instead.
+class CellRange:
+    def __init__(self,table,rows,cols):
+        self.table = table
+        self.rows  = rows
+        self.cols  = cols
+
+    def __iter__(self):
+        for r in self.rows:
+            for c in self.cols:
+                yield Cell(r,c,self.table)
+
+    def Count(self):
+        return len(self.rows) * len(self.cols)
+
+    def Positions(self):
+        return [(r,c) for r in self.rows for c in self.cols]
+
+    # Columns of values back in the order iterating the range gives.
+    def RowByRow(self,columns):
+        if(len(columns) == 1):
+            return columns[0]
+        return [v for row in zip(*columns) for v in row]
+
+    def Numbers(self):
+        return self.RowByRow([self.table.GetColumnNums(c,self.rows) for c in self.cols])
+
+    # The numbers of just the cells at positions, in that order.
+    def NumbersAt(self,positions):
+        byCol = {}
+        for r,c in positions:
+            byCol.setdefault(c,[]).append(r)
+        nums = {}
+        for c,rows in byCol.items():
+            for r,n in zip(rows,self.table.GetColumnNums(c,rows)):
+                nums[(r,c)] = n
+        return [nums[pos] for pos in positions]
+
+    def Values(self):
+        return self.RowByRow([self.table.GetColumnVals(c,self.rows) for c in self.cols])
+
+    # The value of ref with each cell of the range as the current cell.
+    def ValuesOf(self,ref):
+        if(not isinstance(ref,Cell)):
+            return [ref] * self.Count()
+        # $3 is the same rows of another column.
+        if(ref.table is self.table and ref.r == '*' and isinstance(ref.c,int) and ref.c > 0 and not ref.crelative):
+            vals = self.table.GetColumnVals(ref.GetCol(),self.rows)
+            return [v for v in vals for c in self.cols]
+        return ValuesAt(ref,self.Positions())
+
+# The rows from start to end of a range, less the ones the table or
+# the filters leave out.
+def RangeRows(table,start,end,filters):
+    if(start < table.StartRow()):
+        start = table.StartRow()
+    rows = range(start,end+1)
+    filters = [f for f in filters if f]
+    if(not table.ignoreRows and not filters):
+        return rows
+    return [r for r in rows if not table.ShouldIgnoreRow(r) and not any(f.filter(r) for f in filters)]
+
+# The value of ref with each of positions as the current cell.
+def ValuesAt(ref,positions):
+    if(not isinstance(ref,Cell)):
+        return [ref] * len(positions)
+    table = ref.GetTable()
+    r = table.CurRow()
+    c = table.CurCol()
+    vals = []
+    try:
+        for cr,cc in positions:
+            table.SetCurRow(cr)
+            table.SetCurCol(cc)
+            vals.append(ref.GetVal())
+    finally:
+        table.SetCurRow(r)
+        table.SetCurCol(c)
+    return vals
+
+def RangeNums(rng):
+    if(isinstance(rng,CellRange)):
+        return rng.Numbers()
+    return [GetNum(i) for i in rng]
+
+def RangeVals(rng):
+    if(isinstance(rng,CellRange)):
+        return rng.Values()
+    return [GetVal(i) for i in rng]
+
+# Sums the cells of rng where test(a,b) is true. a and b are looked at
+# with each cell of rng as the current cell, b only once from the
+# current cell if fixedB.
+def SumIf(a,b,rng,test,fixedB=False):
+    if(isinstance(rng,CellRange)):
+        va = rng.ValuesOf(a)
+        vb = [GetVal(b)] * rng.Count() if fixedB else rng.ValuesOf(b)
+        # Only the cells that are summed are read as numbers.
+        return sum(rng.NumbersAt([pos for pos,x,y in zip(rng.Positions(),va,vb) if test(x,y)]))
+    cells = list(rng)
+    positions = [(i.GetRow(),i.GetCol()) for i in cells]
+    va = ValuesAt(a,positions)
+    vb = [GetVal(b)] * len(cells) if fixedB else ValuesAt(b,positions)
+    return sum(GetNum(i) for x,y,i in zip(va,vb,cells) if test(x,y))
+
 def CellIterator(table,cell):
     r = cell.r
     c = cell.c
@@ -894,37 +1045,10 @@ class Cell:
         return float(self.GetText())
 
     def GetVal(self):
-        txt = self.GetText().strip()
-        if(util.numberCheck(txt)):
-            if('.' in txt):
-                return float(txt)
-            return int(txt)
-        if(txt.endswith("%")):
-            t = txt[:-1]
-            if(util.numberCheck(t)):
-                f = float(t)
-                f = (f / 100.0)
-                return f
-        l = txt.lower()
-        if(l == "true" or l == "t"):
-            return True
-        if(l == "false"):
-            return False
-        return txt
+        return self.table.GetCellVal(self.GetRow(), self.GetCol())
     
     def GetNum(self):
-        txt = self.GetText().strip()
-        if(util.numberCheck(txt)):
-            if('.' in txt):
-                return float(txt)
-            return int(txt)
-        if(txt.endswith("%")):
-            t = txt[:-1]
-            if(util.numberCheck(t)):
-                f = float(t)
-                f = (f / 100.0)
-                return f
-        return 0
+        return self.table.GetCellNum(self.GetRow(), self.GetCol())
 
 def GetVal(i):
     if(isinstance(i,Cell)):
@@ -1125,131 +1249,43 @@ def tuadd(a):
 
 def vmean(rng):
     """Computes the average value of a column or row. Takes a range of cells"""
-    n = 0
-    s = 0
-    for i in rng:
-        num = GetNum(i)
-        s += num
-        n += 1
-    if(n != 0):
-        return float(s) / float(n)
+    nums = RangeNums(rng)
+    if(len(nums) != 0):
+        return float(sum(nums)) / float(len(nums))
     return 0
 
 def vsum(rng):
     """Computes the sum of a range of cells"""
-    s = 0
-    for i in rng:
-        s += GetNum(i)
-    return s
+    return sum(RangeNums(rng))
 
 # Only adds a row from rng to the sum if a and b are equal.
 def vsumifeq(a,b,rng,*opt):
     """Computes the sum of a range of cells where a == b last parameter of o means b is relative to original offset"""
-    s = 0
-    for i in rng:
-        a_r = a.GetTable().CurRow()
-        a_c = a.GetTable().CurCol()
-        b_r = b.GetTable().CurRow()
-        b_c = b.GetTable().CurCol()
-        i_r = i.GetRow()
-        i_c = i.GetCol()
-        a.GetTable().SetCurRow(i_r)
-        a.GetTable().SetCurCol(i_c)
-        va = GetVal(a)
-        vb = None
-        if opt == None or len(opt) == 0:
-            vb = GetVal(b)
-        a.GetTable().SetCurRow(a_r)
-        a.GetTable().SetCurCol(a_c)
-        b.GetTable().SetCurRow(b_r)
-        b.GetTable().SetCurCol(b_c)
-        if opt != None and len(opt) > 0:
-            vb = GetVal(b)
-        if va == vb:
-            s += GetNum(i)
-    return s
+    return SumIf(a,b,rng,teq,opt != None and len(opt) > 0)
 
 # Only adds a row from rng to the sum if a > b.
 def vsumifgt(a,b,rng):
     """Computes the sum of a range of cells where a > b"""
-    s = 0
-    for i in rng:
-        r = a.GetTable().CurRow()
-        c = a.GetTable().CurCol()
-        cr = i.GetRow()
-        cc = i.GetCol()
-        a.GetTable().SetCurRow(cr)
-        a.GetTable().SetCurCol(cc)
-        va = GetVal(a)
-        vb = GetVal(b)
-        a.GetTable().SetCurRow(c)
-        a.GetTable().SetCurCol(r)
-        if va > GetVal(vb):
-            s += GetNum(i)
-    return s
+    return SumIf(a,b,rng,tgt)
 
 # Only adds a row from rng to the sum if a < b.
 def vsumiflt(a,b,rng):
     """Computes the sum of a range of cells where a < b"""
-    s = 0
-    for i in rng:
-        r = a.GetTable().CurRow()
-        c = a.GetTable().CurCol()
-        cr = i.GetRow()
-        cc = i.GetCol()
-        a.GetTable().SetCurRow(cr)
-        a.GetTable().SetCurCol(cc)
-        va = GetVal(a)
-        vb = GetVal(b)
-        a.GetTable().SetCurRow(c)
-        a.GetTable().SetCurCol(r)
-        if va < GetVal(vb):
-            s += GetNum(i)
-    return s
+    return SumIf(a,b,rng,tlt)
 
 # Only adds a row from rng to the sum if a <= b.
 def vsumiflteq(a,b,rng):
     """Computes the sum of a range of cells where a <= b"""
-    s = 0
-    for i in rng:
-        r = a.GetTable().CurRow()
-        c = a.GetTable().CurCol()
-        cr = i.GetRow()
-        cc = i.GetCol()
-        a.GetTable().SetCurRow(cr)
-        a.GetTable().SetCurCol(cc)
-        va = GetVal(a)
-        vb = GetVal(b)
-        a.GetTable().SetCurRow(c)
-        a.GetTable().SetCurCol(r)
-        if va <= GetVal(vb):
-            s += GetNum(i)
-    return s
+    return SumIf(a,b,rng,tle)
 
 # Only adds a row from rng to the sum if a >= b.
 def vsumifgteq(a,b,rng):
     """Computes the sum of a range of cells where a >= b"""
-    s = 0
-    for i in rng:
-        r = a.GetTable().CurRow()
-        c = a.GetTable().CurCol()
-        cr = i.GetRow()
-        cc = i.GetCol()
-        a.GetTable().SetCurRow(cr)
-        a.GetTable().SetCurCol(cc)
-        va = GetVal(a)
-        vb = GetVal(b)
-        a.GetTable().SetCurRow(c)
-        a.GetTable().SetCurCol(r)
-        if va >= GetVal(vb):
-            s += GetNum(i)
-    return s
+    return SumIf(a,b,rng,tge)
 
 def vmedian(rng):
     """Computes the median (middle) value of a sorted range of cells"""
-    data = list(rng)
-    for i in range(0,len(data)):
-        data[i] = GetVal(data[i])
+    data = RangeVals(rng)
     data.sort()
     dl = len(data)
     v = math.floor(dl/2)
@@ -1264,21 +1300,11 @@ def vmedian(rng):
 
 def vmax(rng):
     """Computes the max value of a range of cells"""
-    m = -999999999
-    for i in rng:
-        num = GetNum(i)
-        if(num > m):
-            m = num
-    return m
+    return max([-999999999] + RangeNums(rng))
 
 def vmin(rng):
     """Computes the minimum value of a range of cells"""
-    m = 999999999
-    for i in rng:
-        num = GetNum(i)
-        if(num < m):
-            m = num
-    return m
+    return min([999999999] + RangeNums(rng))
 
 def mybool(num):
     """Explicitly convert value to a boolean value if possible"""
@@ -1659,7 +1685,7 @@ def LookupNamedTableInFile(name):
                         break
                 pt = view.text_point(row,0)
                 if(isTable(view, pt)):
-                    td = create_table(view,pt)
+                    td = tableCache.GetTable(view,pt)
     return td
 
 def LookupTableFromId(name):
@@ -1668,7 +1694,8 @@ def LookupTableFromId(name):
     if(file):
         node = file.At(row)
         if(node and node.table):
-            td = create_table_from_node(node, node.table['nodeoff'][0])
+            # Read once until the file changes.
+            td = node.env.derive(node, "table", lambda n: create_table_from_node(n, n.table['nodeoff'][0]))
     return td
 
 def LookupTableFromNamedObject(name):
@@ -1728,17 +1755,44 @@ def checkPassed(txt):
 class TableDef(simpev.SimpleEval):
     def range_expr(self,a,b):
         if(isinstance(a,Cell) and isinstance(b,Cell)):
+            table = a.table
             if(a.r == "*" and b.r == "*"):
-                return CellColIterator(a.table, a.GetCol(), b.GetCol())
+                return CellRange(table, [table.CurRow()], range(a.GetCol(), b.GetCol()+1))
             elif(a.c == "*" and b.c == "*"):
-                return CellRowIterator(a.table, a.GetRow(), b.GetRow(), a.rowFilter, b.rowFilter)
+                return CellRange(table, RangeRows(table, a.GetRow(), b.GetRow(), [a.rowFilter, b.rowFilter]), [table.CurCol()])
             elif(a.r != '*' and b.r != '*' and a.c != '*' and b.c != '*'):
-                return CellBoxIterator(a.table,a,b)
+                sr, er = sorted((a.GetRow(), b.GetRow()))
+                sc, ec = sorted((a.GetCol(), b.GetCol()))
+                return CellRange(table, RangeRows(table, sr, er, [a.rowFilter, b.rowFilter]), range(sc, ec+1))
             else:
                 raise RangeExprOnNonCells("End cells must be wild of same type", "range expression is invalid")
         else:
             raise RangeExprOnNonCells(str(a), "range expression is invalid")
 
+    # The cells a reference reads from the current target cell, the ones
+    # range_expr would iterate over, as (firstRow, lastRow, firstCol, lastCol).
+    # None if it is not a cell reference.
+    def ReferenceRect(self,a,b=None):
+        if(not isinstance(a,Cell)):
+            return None
+        if(b == None):
+            r = a.GetRow()
+            c = a.GetCol()
+            return (r,r,c,c)
+        if(not isinstance(b,Cell)):
+            return None
+        if(a.r == "*" and b.r == "*"):
+            r = self.CurRow()
+            return (r,r,min(a.GetCol(),b.GetCol()),max(a.GetCol(),b.GetCol()))
+        elif(a.c == "*" and b.c == "*"):
+            c = self.CurCol()
+            return (max(a.GetRow(),self.StartRow()),b.GetRow(),c,c)
+        elif(a.r != '*' and b.r != '*' and a.c != '*' and b.c != '*'):
+            sr = max(min(a.GetRow(),b.GetRow()),self.StartRow())
+            er = max(a.GetRow(),b.GetRow())
+            return (sr,er,min(a.GetCol(),b.GetCol()),max(a.GetCol(),b.GetCol()))
+        return None
+
     def mysbe(table, name,**kwargs):
         view = sublime.active_window().active_view()
         cell = Cell(table.CurRow(),table.CurCol(),table)
@@ -1832,10 +1886,18 @@ class TableDef(simpev.SimpleEval):
         self.view    = view
         self.linedef = linedef
         self.cellToFormula = None
+        # Which formula cells read which cells, see DependencyGraph.
+        self.deps          = None
+        # Cells read by formulas, only kept while highlighting them.
         self.accessList    = []
+        self.recordAccess  = False
+        # The cells of the table, see orgtablegrid.
+        self.grid          = None
         self.consts        = {}
         self.emptyiszero   = False
         self.startCol      = 1
+        # Cell text written by a batched execution, not in the view yet.
+        self.edits         = None
 
     def RecalculateTableDimensions(self):
         res = recalculate_linedef(self.view,self.start)
@@ -1843,6 +1905,15 @@ class TableDef(simpev.SimpleEval):
             log.error("FAILURE TO RECALCULATE LINE DEFINITION FOR TABLE. Something is wrong!")
         else:
             self.linedef = res
+            self.BuildGrid()
+
+    def BuildGrid(self, lines=None):
+        if(lines == None):
+            if(isinstance(self.view,sublime.View)):
+                lines = grid.ViewLines(self.view)
+            else:
+                lines = self.view._lines
+        self.grid = grid.OrgTableGrid(lines, self.lineToRow, self.linedef)
 
     def Width(self):
         if(not self.linedef):
@@ -1877,24 +1948,39 @@ class TableDef(simpev.SimpleEval):
         self.activeFormula = i
 
     def GetCellText(self,r,c):
-        self.accessList.append([r,c])
-        if(isinstance(self.view,sublime.View)):
-            reg = self.FindCellRegion(r,c)
-            if(reg):
-                text = self.view.substr(reg)
-                if(self.emptyiszero and text.strip() == ""):
-                    return "0"
-                return text.strip()
-            if(self.emptyiszero):
-                return "0"
-        else:
-            row,cs,ce = self.FindCellNodeRegion(r,c)
-            text = self.view._lines[row]
-            cell = text[cs+1:ce].strip()
-            if(self.emptyiszero and cell == ""):
-                return "0"
-            return cell
-        return ""
+        if(self.recordAccess):
+            self.accessList.append([r,c])
+        text = self.grid.Text(r,c)
+        if(self.emptyiszero and text == ""):
+            return "0"
+        return text
+
+    def GetCellNum(self,r,c):
+        if(self.recordAccess):
+            self.accessList.append([r,c])
+        return self.grid.Number(r,c)
+
+    # A column of cells at once, see CellRange.
+    def GetColumnNums(self,c,rows):
+        if(self.recordAccess):
+            self.accessList.extend([r,c] for r in rows)
+        return self.grid.Numbers(c,rows)
+
+    def GetColumnVals(self,c,rows):
+        if(self.recordAccess):
+            self.accessList.extend([r,c] for r in rows)
+        vals = self.grid.Values(c,rows)
+        if(self.emptyiszero):
+            return [0 if v == "" else v for v in vals]
+        return vals
+
+    def GetCellVal(self,r,c):
+        if(self.recordAccess):
+            self.accessList.append([r,c])
+        if(self.emptyiszero and self.grid.Text(r,c) == ""):
+            return 0
+        return self.grid.Value(r,c)
+
     def FindCellRegion(self,r,c):
         if(not r in self.lineToRow):
             return None
@@ -1912,6 +1998,48 @@ class TableDef(simpev.SimpleEval):
         colend   = self.linedef[c]
         return (row,colstart,colend)
         return sublime.Region(self.view.text_point(row,colstart+1),self.view.text_point(row,colend)) 
+    # Batched execution, formulas write their results here and later
+    # formulas read them back from here. RenderTable produces the table
+    # with them filled in, to be written to the view in one go.
+    def BeginBatch(self):
+        self.edits = {}
+
+    def EndBatch(self):
+        self.edits = None
+
+    def SetCellText(self,r,c,text):
+        self.edits[(r,c)] = text
+        self.grid.Set(r,c,text)
+
+    def TableRegion(self):
+        return sublime.Region(self.view.text_point(self.start,0),self.view.line(self.view.text_point(self.end,0)).end())
+
+    # The text of the table with the batched edits filled in. Only the
+    # rows that changed are rewritten and nothing is padded, aligning is
+    # left to table_editor_align. Returns (region, text).
+    def RenderTable(self):
+        region = self.TableRegion()
+        lines  = self.view.substr(region).split('\n')
+        editsByRow = {}
+        for (r,c),text in self.edits.items():
+            editsByRow.setdefault(r,[]).append((c,text))
+        for r,row in self.lineToRow.items():
+            if(r not in editsByRow):
+                continue
+            i = row - self.start
+            line = lines[i]
+            indent = line[:line.find('|')]
+            cells = line.strip().split('|')[1:]
+            if(line.strip().endswith('|')):
+                cells = cells[:-1]
+            cells = [cell.strip() for cell in cells]
+            for c,text in editsByRow[r]:
+                while(len(cells) < c):
+                    cells.append("")
+                cells[c-1] = str(text).strip()
+            lines[i] = indent + "|" + "|".join(" " + cell + " " for cell in cells) + "|"
+        return (region, "\n".join(lines))
+
     def HighlightCells(self, cells,color):
         for cell in cells:
             it = RCIterator(self,cell[0],cell[1])
@@ -2018,6 +2146,7 @@ class TableDef(simpev.SimpleEval):
     def HighlightFormula(self, i):
         self.PreExecute()
         if(not hasattr(self,'highlight') or self.highlight):
+            self.recordAccess = True
             it = SingleFormulaIterator(self,i)
             for n in it:
                 r,c,val,reg,_ = n
@@ -2028,6 +2157,7 @@ class TableDef(simpev.SimpleEval):
                 valStr = str(val)
                 self.HighlightCells(self.accessList,1)
                 self.HighlightCells([[r,c]],2)
+            self.recordAccess = False
         self.HighlightFormulaRegion(i)
         self.PostExecute()
 
@@ -2104,7 +2234,45 @@ class TableDef(simpev.SimpleEval):
                 if(it):
                     for c in it:
                         self.AddCellToFormulaMap(c,i)
-    
+
+    # The cells every formula target reads, worked out from the cell
+    # references in the formulas rather than by evaluating them.
+    def DependencyGraph(self):
+        if(self.deps == None):
+            self.deps = deps.CellDependencyGraph()
+            for i in range(0,self.NumFormulas()):
+                self.AddFormulaDependencies(i)
+        return self.deps
+
+    def AddFormulaDependencies(self,i):
+        expr = self.formulas[i].expr
+        try:
+            refs = formula_references(expr)
+        except (SyntaxError, ValueError):
+            # Never evaluates to anything but an error.
+            refs = []
+        self.expr = expr
+        for cell in self.FormulaTargetCellIterator(i):
+            target = cell.rc()
+            # Only the formula that gets the last word on a cell.
+            if(self.CellToFormula(target) != i):
+                continue
+            if(refs == None):
+                self.deps.AddReadsAll(target)
+                continue
+            self.SetCurRow(target[0])
+            self.SetCurCol(target[1])
+            rects = []
+            try:
+                for ref in refs:
+                    rect = self.ReferenceRect(*[part(self) for part in ref])
+                    if(rect):
+                        rects.append(rect)
+            except Exception:
+                self.deps.AddReadsAll(target)
+                continue
+            self.deps.Add(target,rects)
+
     def BuildNameMap(self):
         self.nameToCell = {}
         for r,row in self.colNames:
@@ -2136,7 +2304,7 @@ class TableDef(simpev.SimpleEval):
         self.accessList = []
         try:
             self.emptyiszero = self.formulas[i].EmptyIsZero()
-            val = self.eval(self.formulas[i].expr)
+            val = self.eval_compiled(self.formulas[i].expr)
             if(val and isinstance(val,Cell)):
                 val = val.GetVal()
             return val
@@ -2155,6 +2323,11 @@ class TableDef(simpev.SimpleEval):
         return dm.printfout
 
 
+def FormatCellValue(val, fmt):
+    if(val and isinstance(val,float) and fmt and "%" in fmt):
+        val = fmt % val
+    return str(val)
+
 def findOccurrences(s, ch):
     return [i for i, letter in enumerate(s) if letter == ch]
 
@@ -2194,7 +2367,8 @@ def create_table(view, at=None):
     if(at != None):
         row,_ = view.rowcol(at)
     start_row = row
-    last_row = view.lastRow()
+    lines = grid.ViewLines(view)
+    last_row = len(lines) - 1
     end = last_row
     start = row
     linedef = None
@@ -2205,8 +2379,7 @@ def create_table(view, at=None):
     formulaRow = None
     formulaLine = None
     for r in range(row-1,0,-1):
-        pt = view.text_point(r, 0)
-        line = view.substr(view.line(pt))
+        line = lines[r]
         if(RE_TABLE_LINE.search(line) or RE_TABLE_HLINE.search(line) or RE_END_BLOCK.search(line)):
             continue
         row = r+1
@@ -2225,8 +2398,7 @@ def create_table(view, at=None):
     ignoreRows = {}
     for r in range(row,last_row+1):
         rowNum += 1
-        pt = view.text_point(r, 0)
-        line = view.substr(view.line(pt))
+        line = lines[r]
         m = RE_FMT_LINE.search(line)
         # Found a table hline. These don't get counted
         if(RE_TABLE_HLINE.search(line)):
@@ -2312,8 +2484,7 @@ def create_table(view, at=None):
                     lastRow = rowNum - 1
             break
     for r in range(row,0,-1):
-        pt = view.text_point(r, 0)
-        line = view.substr(view.line(pt))
+        line = lines[r]
         if(RE_TABLE_LINE.search(line)):
             continue
         else:
@@ -2329,6 +2500,7 @@ def create_table(view, at=None):
     td.formulaLine   = formulaLine
     td.lineToRow     = lineToRow
     td.rowCount      = lastRow
+    td.BuildGrid(lines)
     td.autoCompute   = autoCompute
     td.nameRowsAbove = namesRowsAbove
     td.nameRowsBelow = namesRowsBelow
@@ -2539,6 +2711,7 @@ def create_table_from_node(node, row):
     td.formulaLine   = formulaLine
     td.lineToRow     = lineToRow
     td.rowCount      = lastRow
+    td.BuildGrid(lineData)
     td.autoCompute   = autoCompute
     td.nameRowsAbove = namesRowsAbove
     td.nameRowsBelow = namesRowsBelow
@@ -2616,6 +2789,17 @@ def SingleFormulaIterator(table, i):
         yield [r, c, val, table.FindCellRegion(r, c), table.FormulaFormatter(i)]
 
 
+# Evaluates the formula of each of the target cells, in that order.
+def TargetCellIterator(table, cells):
+    for r, c in cells:
+        i = table.CellToFormula((r, c))
+        table.SetActiveFormula(i)
+        table.SetCurRow(r)
+        table.SetCurCol(c)
+        val = table.Execute(i)
+        yield (r, c, val, table.FindCellRegion(r, c), table.FormulaFormatter(i))
+
+
 def FormulaIterator(table):
     for i in range(0, table.NumFormulas()):
         table.SetActiveFormula(i)
@@ -2670,6 +2854,35 @@ class OrgInsertRandomRowFromTableCommand(sublime_plugin.TextCommand):
                 self.view.window().show_quick_panel(self.ids, self.on_done_st4, -1, -1)
 
 
+# ================================================================================
+# Evaluates every cell it yields against the table in memory, later
+# formulas see what earlier ones wrote, and writes the whole table back
+# with a single replace. One undo step however many cells change.
+def ExecuteBatched(view, td, it, onDone):
+    td.BeginBatch()
+    try:
+        for r,c,val,reg,fmt in it:
+            td.SetCellText(r,c,FormatCellValue(val,fmt))
+        region, text = td.RenderTable()
+    finally:
+        td.EndBatch()
+    view.run_command("org_internal_replace_table", {"start": region.begin(), "end": region.end(), "text": text, "onDone": evt.Make(onDone)})
+
+# Replaces a table and has Table Editor align it within the same undo step.
+class OrgInternalReplaceTableCommand(sublime_plugin.TextCommand):
+    def run(self, edit, start, end, text, onDone=None):
+        region = sublime.Region(start, end)
+        if(self.view.substr(region) != text):
+            self.view.replace(edit, region, text)
+        self.view.sel().clear()
+        self.view.sel().add(sublime.Region(start,start))
+        self.view.run_command('table_editor_align')
+        # Reload the file automatically when we edit it.
+        file = db.Get().FindInfo(self.view.file_name())
+        if(file != None):
+            file.LoadS(self.view)
+        evt.EmitIf(onDone)
+
 # ================================================================================
 class OrgExecuteFormulaCommand(sublime_plugin.TextCommand):
     def on_reformat(self):
@@ -2694,6 +2907,16 @@ class OrgExecuteFormulaCommand(sublime_plugin.TextCommand):
         #print("REPLACING WITH: " + str(val))
         self.view.run_command("org_internal_replace", {"start": reg.begin(), "end": reg.end(), "text": str(val), "onDone": evt.Make(self.on_done_cell)})
 
+    def process_all(self):
+        if(sets.Get("tableExecuteBatched", True)):
+            ExecuteBatched(self.view, self.td, self.it, self.on_written)
+        else:
+            self.process_next()
+
+    def on_written(self):
+        self.td.RecalculateTableDimensions()
+        self.on_done()
+
     def on_done(self):
         global highlightEnabled
         highlightEnabled = True
@@ -2713,7 +2936,7 @@ class OrgExecuteFormulaCommand(sublime_plugin.TextCommand):
         self.td.PreExecute()
         formulaIdx = self.td.GetFormulaAt()
         self.it = SingleFormulaIterator(self.td,formulaIdx)
-        self.process_next()
+        self.process_all()
 
     def run(self, edit,onDone=None,skipFormula=None,at=None,clearHighlights=True):
         global highlightEnabled
@@ -2753,6 +2976,16 @@ class OrgExecuteTableCommand(sublime_plugin.TextCommand):
         #print("REPLACING WITH: " + str(val))
         self.view.run_command("org_internal_replace", {"start": reg.begin(), "end": reg.end(), "text": str(val), "onDone": evt.Make(self.on_done_cell)})
 
+    def process_all(self):
+        if(sets.Get("tableExecuteBatched", True)):
+            ExecuteBatched(self.view, self.td, self.it, self.on_written)
+        else:
+            self.process_next()
+
+    def on_written(self):
+        self.td.RecalculateTableDimensions()
+        self.on_done()
+
     def on_done(self):
         global highlightEnabled
         highlightEnabled = True
@@ -2771,7 +3004,7 @@ class OrgExecuteTableCommand(sublime_plugin.TextCommand):
         self.td.ClearAllRegions()
         self.td.PreExecute()
         self.it = FormulaIterator(self.td)
-        self.process_next()
+        self.process_all()
 
     def run(self, edit,onDone=None,skipFormula=None,at=None,clearHighlights=True):
         global highlightEnabled
@@ -2952,7 +3185,37 @@ class OrgTableAutoComputeCommand(sublime_plugin.TextCommand):
             self.view.run_command("org_highlight_cell")
         evt.EmitIf(self.onDone)
 
+    def on_written(self):
+        self.td.RecalculateTableDimensions()
+        self.td.PostExecute()
+        # Back to the cell the table editor moved on to.
+        reg = self.td.FindCellRegion(*self.cursor) if self.cursor else None
+        if(reg):
+            self.view.sel().clear()
+            self.view.sel().add(min(reg.begin()+1,reg.end()))
+        self.on_done()
+
+    # Recomputes what reads the edited cell and writes it in one edit.
+    def recompute_dependents(self):
+        td = tableCache.GetTable(self.view)
+        if(not td or not self.cell):
+            self.on_done()
+            return
+        order, cyclic = td.DependencyGraph().Affected([tuple(self.cell)])
+        if(cyclic):
+            sublime.status_message("ORG Table WARNING: cells {0} have circular references and were not recomputed".format(", ".join("@{0}${1}".format(r,c) for r,c in cyclic)))
+        if(not order):
+            self.on_done()
+            return
+        self.td = td
+        self.cursor = td.CursorToCell()
+        td.PreExecute()
+        ExecuteBatched(self.view, td, TargetCellIterator(td, order), self.on_written)
+
     def on_aligned(self):
+        if(sets.Get("tableAutoComputeDependents", True)):
+            self.recompute_dependents()
+            return
         td = tableCache.GetTable(self.view)
         if(td):
             cell = td.CursorToCell()
@@ -2967,6 +3230,8 @@ class OrgTableAutoComputeCommand(sublime_plugin.TextCommand):
                         if(val and isinstance(val,float) and fmt and "%" in fmt):
                             val = fmt % val
                         self.view.run_command("org_internal_replace", {"start": reg.begin(), "end": reg.end(), "text": str(val), "onDone": evt.Make(self.on_done_cell)})
+                        # The rest of the formula sees the new value.
+                        td.grid.Set(r,c,str(val))
 
     def run(self,edit,onDone = None):
         global highlightEnabled
@@ -2974,6 +3239,9 @@ class OrgTableAutoComputeCommand(sublime_plugin.TextCommand):
         self.onDone = onDone
         highlightEnabled = False
         self.view.run_command('table_editor_align')
+        # The table editor moves on from the edited cell before on_aligned.
+        td = tableCache.GetTable(self.view)
+        self.cell = td.CursorToCell() if td else None
         sublime.set_timeout(self.on_aligned,1)
 
 
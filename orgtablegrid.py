@@ -0,0 +1,159 @@
+import sublime
+import logging
+import OrgExtended.orgutil.util as util
+
+log = logging.getLogger(__name__)
+
+# Unique marker for a cell that has not been parsed yet.
+UNPARSED = object()
+
+
+# The number in txt, 0 if there is none. 50% is 0.5
+def ParseNumber(txt):
+    if(util.numberCheck(txt)):
+        if('.' in txt):
+            return float(txt)
+        return int(txt)
+    if(txt.endswith("%")):
+        t = txt[:-1]
+        if(util.numberCheck(t)):
+            f = float(t)
+            f = (f / 100.0)
+            return f
+    return 0
+
+
+# What a formula sees for txt: a number, a boolean or the text itself.
+def ParseValue(txt):
+    if(util.numberCheck(txt)):
+        if('.' in txt):
+            return float(txt)
+        return int(txt)
+    if(txt.endswith("%")):
+        t = txt[:-1]
+        if(util.numberCheck(t)):
+            f = float(t)
+            f = (f / 100.0)
+            return f
+    l = txt.lower()
+    if(l == "true" or l == "t"):
+        return True
+    if(l == "false"):
+        return False
+    return txt
+
+
+# Lines of a view, read a block at a time the first time one of them
+# is asked for. Tables are found and read without going to the view
+# for every line.
+class ViewLines:
+    BLOCK = 256
+
+    def __init__(self, view):
+        self.view   = view
+        self.count  = view.rowcol(view.size())[0] + 1
+        self.blocks = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, r):
+        if(r < 0):
+            r += self.count
+        if(r < 0 or r >= self.count):
+            raise IndexError(r)
+        b = r // ViewLines.BLOCK
+        lines = self.blocks.get(b)
+        if(lines is None):
+            first = b * ViewLines.BLOCK
+            last  = min(first + ViewLines.BLOCK, self.count) - 1
+            start = self.view.text_point(first, 0)
+            end   = self.view.line(self.view.text_point(last, 0)).end()
+            lines = self.blocks[b] = self.view.substr(sublime.Region(start, end)).split('\n')
+        return lines[r - b * ViewLines.BLOCK]
+
+
+# The cells of a table, read once from the lines it was parsed from.
+#
+# The text of each cell is kept column by column, indexed by cell row,
+# cut out of its line at the column boundaries of the first row like
+# the cell regions are. Numbers and values are parsed from the text
+# the first time a formula asks for them.
+class OrgTableGrid:
+    def __init__(self, lines, lineToRow, linedef):
+        self.height = max(lineToRow) if lineToRow else 0
+        self.width  = len(linedef) - 1 if linedef else 0
+        self.text   = [[""] * (self.height + 1) for c in range(self.width + 1)]
+        self.nums   = [None] * (self.width + 1)
+        self.vals   = [None] * (self.width + 1)
+        for r, row in lineToRow.items():
+            line = lines[row]
+            for c in range(1, self.width + 1):
+                self.text[c][r] = line[linedef[c-1]+1:linedef[c]].strip()
+
+    def Has(self, r, c):
+        return r >= 1 and r <= self.height and c >= 1 and c <= self.width
+
+    def Text(self, r, c):
+        if(not self.Has(r, c)):
+            return ""
+        return self.text[c][r]
+
+    def Number(self, r, c):
+        if(not self.Has(r, c)):
+            return 0
+        col = self.nums[c]
+        if(col is None):
+            col = self.nums[c] = [UNPARSED] * (self.height + 1)
+        num = col[r]
+        if(num is UNPARSED):
+            num = col[r] = ParseNumber(self.text[c][r])
+        return num
+
+    def Value(self, r, c):
+        if(not self.Has(r, c)):
+            return ""
+        col = self.vals[c]
+        if(col is None):
+            col = self.vals[c] = [UNPARSED] * (self.height + 1)
+        val = col[r]
+        if(val is UNPARSED):
+            val = col[r] = ParseValue(self.text[c][r])
+        return val
+
+    # The numbers or values of column c in rows, a list or a range of
+    # cell rows. Only the rows asked for are parsed.
+    def Numbers(self, c, rows):
+        return self.Parsed(self.nums, ParseNumber, c, rows, 0)
+
+    def Values(self, c, rows):
+        return self.Parsed(self.vals, ParseValue, c, rows, "")
+
+    def Parsed(self, cache, parse, c, rows, missing):
+        if(c < 1 or c > self.width):
+            return [missing] * len(rows)
+        col = cache[c]
+        if(col is None):
+            col = cache[c] = [UNPARSED] * (self.height + 1)
+        out = self.Pick(col, rows, missing)
+        if(UNPARSED in out):
+            text = self.text[c]
+            for r in rows:
+                if(r >= 1 and r <= self.height and col[r] is UNPARSED):
+                    col[r] = parse(text[r])
+            out = self.Pick(col, rows, missing)
+        return out
+
+    def Pick(self, col, rows, missing):
+        if(isinstance(rows, range) and rows.step == 1 and len(rows) > 0 and rows[0] >= 1 and rows[-1] <= self.height):
+            return col[rows[0]:rows[-1] + 1]
+        return [col[r] if (r >= 1 and r <= self.height) else missing for r in rows]
+
+    def Set(self, r, c, text):
+        if(not self.Has(r, c)):
+            return
+        self.text[c][r] = text.strip()
+        if(self.nums[c] is not None):
+            self.nums[c][r] = UNPARSED
+        if(self.vals[c] is not None):
+            self.vals[c][r] = UNPARSED
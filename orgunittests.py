@@ -6,11 +6,13 @@ from pathlib import Path
 import os
 import fnmatch
 import OrgExtended.orgparse.node as node
+import OrgExtended.orgparse.loader as loader
 import OrgExtended.orgutil.util as util
 import logging
 import sys
 import traceback 
 import OrgExtended.orgdb as db
+import OrgExtended.orgagenda as agenda
 import OrgExtended.asettings as sets
 import OrgExtended.pymitter as evt
 import OrgExtended.orginsertselected as ins
@@ -18,6 +20,8 @@ import OrgExtended.simple_eval as simpev
 import OrgExtended.orgextension as ext
 import OrgExtended.orgparse.date as orgdate
 import OrgExtended.orgduration as orgduration
+import OrgExtended.orgtabledeps as deps
+import OrgExtended.orgtableformula as tablefmla
 from   OrgExtended.orgplist import *
 import math
 import random
@@ -76,3 +80,287 @@ class OrgPlistTestCommand(sublime_plugin.TextCommand):
         p.AddFromPList(":say hello world exclusive")
         util.TEST('exclusiveList',p.Get('say',None),['exclusive'],"test it")
 
+
+
+# What the parser made of a node, two parses of the same text
+# have to agree on all of it.
+def NodeSummary(n):
+    return (n.level, n.heading, n.todo, sorted(n.tags), n.start_row, n.get_body(format='raw'),
+        sorted(n.properties.items()), n.scheduled.start, n.deadline.start, n.closed.start,
+        [(c.start, c.end) for c in n.clock])
+
+def TreeSummary(root):
+    return [NodeSummary(n) for n in root[1:]]
+
+def FindHeading(root, heading):
+    for n in root[1:]:
+        if(n.heading == heading):
+            return n
+    return None
+
+def ParseTestDate(text):
+    if(' ' in text):
+        return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M")
+    return datetime.datetime.strptime(text, "%Y-%m-%d")
+
+# Checks the parser, and the dates it produces, against the cases
+# in tests/parserunittests.org
+class OrgParserTestCommand(sublime_plugin.TextCommand):
+    def run(self,edit):
+        data  = sublime.load_resource("Packages/OrgExtended/tests/parserunittests.org")
+        lines = data.replace('\r','').split('\n')
+        root  = loader.loadi(list(lines), filename="parserunittests.org", lazy=False)
+        self.TestPlanning(root)
+        self.TestLazy(lines, root)
+        self.TestTree(root)
+        self.TestReparse(lines)
+        self.TestRepeaters(root)
+        self.TestFilters(root)
+
+    def TestPlanning(self, root):
+        n = FindHeading(root, "Planning line is read once")
+        util.TEST("planning scheduled",n.scheduled.start,datetime.date(2021,3,1),"Scheduled date not read")
+        util.TEST("planning deadline",n.deadline.start,datetime.date(2021,3,5),"Deadline date not read")
+        body = [l.strip() for l in n.get_body(format='raw').split('\n')]
+        util.TEST("planning body",body,["First body line [[file:other.org][other]]","Last body line"],"Planning line in the body or a body line twice")
+        util.TEST("planning clock",len(n.clock),1,"Clock after the planning line read more than once")
+        links = [l for l in root.env.links if l.row > n.start_row and l.row <= n.end_row]
+        util.TEST("planning links",len(links),1,"Link after the planning line read more than once")
+        n = FindHeading(root, "Closed on a line of its own")
+        util.TEST("planning closed",n.closed.start,datetime.datetime(2021,3,2,9,0),"Closed date not read")
+        util.TEST("planning second line",n.scheduled.start,datetime.date(2021,3,1),"Scheduled on the second planning line not read")
+        util.TEST("planning second body",n.get_body(format='raw').strip(),"Only body line","Planning lines in the body")
+
+    # Bodies parsed on first use have to come out the same as
+    # bodies parsed while loading.
+    def TestLazy(self, lines, root):
+        lazy = loader.loadi(list(lines), filename="parserunittests.org", lazy=True)
+        util.TEST("lazy ids",sorted(lazy.env.ids.keys()),sorted(root.env.ids.keys()),"Prescan missed ids")
+        util.TEST("lazy links",len(lazy.env.links),len(root.env.links),"Prescan missed links")
+        util.TEST("lazy tree",TreeSummary(lazy),TreeSummary(root),"Lazy bodies differ from eager ones")
+
+    def TestTree(self, root):
+        parent = FindHeading(root, "Parent")
+        util.TEST("tree children",[c.heading for c in parent.children],["Child one","Child two"],"Wrong children")
+        util.TEST("tree parent",FindHeading(root, "Grandchild").parent.heading,"Child two","Wrong parent")
+        util.TEST("tree top parent",FindHeading(root, "Tree").parent.is_root(),True,"Top heading not under root")
+        util.TEST("tree subtree",[c.heading for c in parent],["Parent","Child one","Child two","Grandchild"],"Wrong subtree")
+        util.TEST("tree slice",[c.heading for c in parent[1:3]],["Child one","Child two"],"Wrong slice")
+        # Every row belongs to the last heading at or above it.
+        owner = root
+        wrong = []
+        for row in range(0, FindHeading(root, "Repeaters").start_row + 3):
+            for n in root[1:]:
+                if(n.start_row == row):
+                    owner = n
+            if(root.at(row) is not owner):
+                wrong.append(row)
+        util.TEST("tree at",wrong,[],"at() gave the wrong node for these rows")
+
+    # Incremental reparses have to give the same tree as parsing the
+    # changed text from scratch.
+    def TestReparse(self, lines):
+        def Replace(old, new):
+            return lambda l: [new if x == old else x for x in l]
+        def InsertAfter(after, new):
+            return lambda l: sum([[x] + new if x == after else [x] for x in l], [])
+        edits = [
+            ("body line",       Replace("    child body", "    child body changed [[file:new.org][new]]")),
+            ("new heading",     InsertAfter("    child body", ["*** Inserted :tag:", "    SCHEDULED: <2021-04-01 Thu>"])),
+            ("removed heading", Replace("**** Grandchild", "    no longer a heading")),
+            ("new level",       Replace("** Sibling                                                        :work:home:", "* Sibling")),
+            ("last line",       lambda l: l + ["* Appended", "  text"]),
+        ]
+        for name, edit in edits:
+            new  = edit(lines)
+            root = loader.loadi(list(lines), filename="parserunittests.org")
+            ok   = node.reparse_lines(root, lines, new)
+            util.TEST("reparse " + name,ok,True,"Change was not reparsed incrementally")
+            full = loader.loadi(list(new), filename="parserunittests.org")
+            util.TEST("reparse tree " + name,TreeSummary(root),TreeSummary(full),"Incremental reparse differs from a full parse")
+        root = loader.loadi(list(lines), filename="parserunittests.org")
+        new  = Replace("#+TODO: TODO NEXT | DONE", "#+TODO: TODO | DONE")(lines)
+        util.TEST("reparse header",node.reparse_lines(root, lines, new),False,"Header change must need a full parse")
+
+    def TestRepeaters(self, root):
+        for n in FindHeading(root, "Repeaters").children:
+            date = n.scheduled
+            for day in n.get_property("REPEATS_ON").split():
+                got = date.repeat_on(ParseTestDate(day).date())
+                util.TEST("repeat " + n.heading + " on " + day,got.date() if got else None,ParseTestDate(day).date(),"Should repeat on this day")
+            for day in n.get_property("SKIPS").split():
+                util.TEST("repeat " + n.heading + " skips " + day,date.repeat_on(ParseTestDate(day).date()),None,"Should not repeat on this day")
+            after = ParseTestDate(n.get_property("AFTER"))
+            util.TEST("repeat " + n.heading + " next",date.next_repeat_from(after),ParseTestDate(n.get_property("NEXT")),"Wrong next repeat")
+
+    # Filtering through the node index has to find the same nodes
+    # as checking every node.
+    def TestFilters(self, root):
+        file = db.FileInfo("parserunittests.org", root, [])
+        file.isOrgDir = True
+        cases = [
+            ({"tagfilter": "+work"}, ["Parent","Child one","Child two","Grandchild","Sibling"]),
+            ({"tagfilter": "+work -home"}, ["Parent","Child one"]),
+            ({"tagfilter": "|home"}, ["Child two","Grandchild","Sibling"]),
+            ({"statefilter": "+TODO"}, ["Planning line is read once","Child two"]),
+            ({"statefilter": "|NEXT |DONE"}, ["Closed on a line of its own","Child one"]),
+            ({"statefilter": "+TODO", "tagfilter": "+home"}, ["Child two"]),
+            ({"tagfilter": "+work", "hasschedule": True}, []),
+        ]
+        for kwargs, wanted in cases:
+            view = agenda.AgendaBaseView("Filter Test", False, **kwargs)
+            view.set_entries_filtered(view.generate_entries([file]))
+            util.TEST("filter " + str(kwargs),[e['node'].heading for e in view.entries],wanted,"Filter found the wrong nodes")
+
+
+# Checks which formula cells get recomputed after a cell changes,
+# and in what order. See the Dependent Cells table in
+# tests/tableunittests.org for the same on a real table.
+class OrgTableDependencyTestCommand(sublime_plugin.TextCommand):
+    def run(self,edit):
+        g = deps.CellDependencyGraph()
+        g.Add((2,2), [(2,2,1,1)])
+        g.Add((2,3), [(2,2,2,2)])
+        g.Add((5,1), [(2,4,1,3)])
+        g.Add((3,3), [(3,3,3,3)])
+        util.TEST("deps readers",sorted(g.ReadersOf((2,1))),[(2,2),(5,1)],"Wrong readers")
+        util.TEST("deps not self",sorted(g.ReadersOf((3,3))),[(5,1)],"A cell reading itself is not its own reader")
+        util.TEST("deps chain",g.Affected([(2,1)]),([(2,2),(2,3),(5,1)],[]),"Readers have to come after what they read")
+        util.TEST("deps edited target",g.Affected([(2,2)]),([(2,2),(2,3),(5,1)],[]),"An edited target is recomputed too")
+        util.TEST("deps self read",g.Affected([(3,3)]),([(3,3),(5,1)],[]),"Reading itself is not a cycle")
+        util.TEST("deps unread",g.Affected([(4,4)]),([],[]),"Nothing reads this cell")
+        g.AddReadsAll((6,1))
+        util.TEST("deps reads all",g.Affected([(9,9)]),([(6,1)],[]),"A target reading everything reads every cell")
+
+        g = deps.CellDependencyGraph()
+        g.Add((2,3), [(2,2,1,1)])
+        g.AddReadsAll((2,4))
+        g.AddReadsAll((2,5))
+        util.TEST("deps two reads all",g.Affected([(2,1)]),([(2,3),(2,4),(2,5)],[]),"Targets reading everything are no cycle")
+        g.Add((3,1), [(2,2,4,4)])
+        util.TEST("deps reads all readers",g.Affected([(2,4)]),([(2,4),(2,5),(3,1)],[]),"Readers of a target reading everything come after it")
+
+        g = deps.CellDependencyGraph()
+        g.Add((1,1), [(1,1,2,2)])
+        g.Add((1,2), [(1,1,1,1)])
+        g.Add((1,3), [(1,1,2,2)])
+        g.Add((2,1), [(2,2,2,2)])
+        util.TEST("deps cycle",g.Affected([(1,1)]),([],[(1,1),(1,2),(1,3)]),"Cycle and what reads it have no order")
+        util.TEST("deps outside cycle",g.Affected([(2,2)]),([(2,1)],[]),"Cycle elsewhere in the table")
+
+        util.TEST("deps refs",len(self.References("$1*2+@2$3")),2,"Two cell references")
+        util.TEST("deps range ref",[len(r) for r in self.References("vsum(@2$1..@4$3)")],[2],"A range is one reference of two cells")
+        util.TEST("deps remote",self.References("remote('other',@1$1)"),[],"Remote cells are in another table")
+
+    # The references of a formula the way a table sees it.
+    def References(self, expr):
+        return tablefmla.formula_references(tablefmla.replace_cell_references(expr.replace("..","//")))
+
+
+# Compare a rebuild that has to parse every file
+# against one that restores everything from the db cache.
+class OrgDbCacheBenchmarkCommand(sublime_plugin.TextCommand):
+    def run(self,edit):
+        d = db.Get()
+        start = time.time()
+        d.RebuildDb(useCache=False)
+        uncached = time.time() - start
+        # Prime the cache then time a warm rebuild.
+        d.RebuildDb(useCache=True)
+        start = time.time()
+        d.RebuildDb(useCache=True)
+        warm = time.time() - start
+        msg = "Org db rebuild: {0} files, cold {1:.3f}s, warm {2:.3f}s".format(len(d.Files), uncached, warm)
+        print(msg)
+        sublime.status_message(msg)
+
+
+# Headings with the kinds of body lines the parser has to sort out.
+def SyntheticOrgLines(count):
+    body = [
+        "  SCHEDULED: <2021-03-04 Thu 10:00>",
+        "  :PROPERTIES:",
+        "  :ID: {0}",
+        "  :Effort: 1:00",
+        "  :END:",
+        "  :LOGBOOK:",
+        "  CLOCK: [2021-01-01 Fri 10:00]--[2021-01-01 Fri 11:00] =>  1:00",
+        "  :END:",
+        "  Some text with a [[file:other.org::*Heading][link]] and <<target{0}>>",
+        "  #+NAME: table{0}",
+        "  | a | b |",
+        "  |---+---|",
+        "  | 1 | 2 |",
+        "  #+BEGIN_SRC python",
+        "  print('hello')",
+        "  #+END_SRC",
+        "  - State \"DONE\"       from \"TODO\"       [2021-01-02 Sat 10:00]",
+        "  A plain line of text that does not contain anything special.",
+        "  <2021-02-02 Tue>--<2021-02-03 Wed>",
+    ]
+    lines = []
+    i = 0
+    while len(lines) < count:
+        lines.append("{0} TODO Heading {1} :tag{2}:".format("*" * (1 + i % 3), i, i % 7))
+        lines.extend(l.format(i) for l in body)
+        i += 1
+    return lines[:count]
+
+# Time the org parser on the test file and a large synthetic file,
+# parsing every body up front and leaving them for later.
+class OrgParserBenchmarkCommand(sublime_plugin.TextCommand):
+    def Time(self, name, lines, repeat):
+        results = []
+        for lazy in [False, True]:
+            start = time.time()
+            for i in range(repeat):
+                root = loader.loadi(lines, filename=name, lazy=lazy)
+            parse = (time.time() - start) / repeat
+            start = time.time()
+            root.env.parse_bodies()
+            results.append("{0} {1:.3f}s (+{2:.3f}s bodies)".format("lazy" if lazy else "eager", parse, time.time() - start))
+        return "{0} ({1} lines): {2}".format(name, len(lines), ", ".join(results))
+
+    def run(self,edit):
+        testfile = os.path.join(sublime.packages_path(), "OrgExtended", "tests", "testfile.org")
+        with open(testfile, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        msgs = [self.Time("testfile.org", lines, 20)]
+        msgs.append(self.Time("synthetic", SyntheticOrgLines(100000), 1))
+        for msg in msgs:
+            print(msg)
+        sublime.status_message(" | ".join(msgs))
+
+# Time rendering the todo list straight into a view against
+# rendering it through the agenda render buffer.
+class OrgAgendaRenderBenchmarkCommand(sublime_plugin.TextCommand):
+    def Time(self, view, todo, edit, buffered):
+        view.set_read_only(False)
+        view.erase(edit, sublime.Region(0, view.size()))
+        todo.view = view
+        start = time.time()
+        if buffered:
+            todo.DoRenderView(edit)
+        else:
+            todo.RenderView(edit)
+        return time.time() - start
+
+    def run(self,edit):
+        view = self.view.window().new_file()
+        view.set_scratch(True)
+        view.set_name("Org Render Benchmark")
+        msgs = []
+        for count in [300, 1000, 3000]:
+            # Every synthetic heading is 20 lines
+            root = loader.loadi(SyntheticOrgLines(count * 20), filename="synthetic.org")
+            file = db.FileInfo("synthetic.org", root, [])
+            todo = agenda.TodoView("Render Benchmark", False)
+            # Render every entry, not just the first agendaTodoPageSize.
+            todo.endsView = False
+            todo.entries = [{"node": n, "file": file} for n in root[1:]]
+            direct   = self.Time(view, todo, edit, False)
+            buffered = self.Time(view, todo, edit, True)
+            msgs.append("{0} entries: direct {1:.3f}s, buffered {2:.3f}s".format(len(todo.entries), direct, buffered))
+        for msg in msgs:
+            print(msg)
+        sublime.status_message(" | ".join(msgs))
@@ -325,6 +325,15 @@ class SimpleEval(object):  # pylint: disable=too-few-public-methods
         # and evaluate:
         return self._eval(ast.parse(expr.strip()).body[0])
 
+    def eval_compiled(self, expr):
+        """ evaluate an expression like eval does, but from its compiled
+            form, see compile_expr. Use it when the same expression is
+            evaluated many times. """
+
+        self.expr = expr
+
+        return compile_expr(expr)(self)
+
     def _eval(self, node):
         """ The internal evaluator used on each node in the parsed tree. """
 
@@ -547,6 +556,10 @@ class EvalWithCompoundTypes(SimpleEval):
         self._max_count = 0
         return super(EvalWithCompoundTypes, self).eval(expr)
 
+    def eval_compiled(self, expr):
+        self._max_count = 0
+        return super(EvalWithCompoundTypes, self).eval_compiled(expr)
+
     def _eval_dict(self, node):
         return {self._eval(k): self._eval(v)
                 for (k, v) in zip(node.keys, node.values)}
@@ -610,6 +623,294 @@ class EvalWithCompoundTypes(SimpleEval):
         return to_return
 
 
+########################################
+# Compiled expressions:
+#
+# eval() parses the expression and walks the tree through self.nodes
+# every time it is called. Evaluating the same text over and over
+# (a table formula over every row of a column, say) can instead
+# compile it once into a tree of closures, each one already knowing
+# what kind of node it evaluates. The closures take the evaluator as
+# their argument and look up operators, functions and names on it
+# when they run, so one compiled expression serves every evaluator.
+# Node types without a compiled form are handed to evaluator._eval.
+
+COMPILE_CACHE_SIZE = 512
+
+_compiled = {}
+
+
+def compile_expr(expr):
+    """ the compiled form of expr, parsed the first time this text
+        is seen and reused from then on """
+
+    code = _compiled.get(expr)
+    if code is None:
+        code = _compile(ast.parse(expr.strip()).body[0])
+        if len(_compiled) >= COMPILE_CACHE_SIZE:
+            _compiled.clear()
+        _compiled[expr] = code
+    return code
+
+
+def compile_node(node):
+    """ the compiled form of a single node of a parsed expression """
+
+    return _compile(node)
+
+
+def _compile(node):
+    try:
+        compiler = _COMPILERS[type(node)]
+    except KeyError:
+        return lambda ev: ev._eval(node)
+    return compiler(node)
+
+
+def _compile_raise(exc):
+    def run(ev):
+        raise exc
+    return run
+
+
+def _compile_expr(node):
+    return _compile(node.value)
+
+
+def _compile_assign(node):
+    value = _compile(node.value)
+
+    def run(ev):
+        warnings.warn("Assignment ({}) attempted, but this is ignored".format(ev.expr), AssignmentAttempted)
+        return value(ev)
+    return run
+
+
+def _compile_import(node):
+    return _compile_raise(FeatureNotAvailable("Sorry, 'import' is not allowed."))
+
+
+def _compile_num(node):
+    value = node.n
+    return lambda ev: value
+
+
+def _compile_str(node):
+    value = node.s
+    if len(value) > MAX_STRING_LENGTH:
+        return _compile_raise(IterableTooLong("String Literal in statement is too long!"
+                                              " ({0}, when {1} is max)".format(
+                                                  len(value), MAX_STRING_LENGTH)))
+    return lambda ev: value
+
+
+def _compile_constant(node):
+    value = node.value
+    if hasattr(value, '__len__') and len(value) > MAX_STRING_LENGTH:
+        return _compile_raise(IterableTooLong("Literal in statement is too long!"
+                                              " ({0}, when {1} is max)".format(len(value), MAX_STRING_LENGTH)))
+    return lambda ev: value
+
+
+def _compile_name(node):
+    name = node.id
+
+    def run(ev):
+        names = ev.names
+        try:
+            if hasattr(names, '__getitem__'):
+                return names[name]
+            elif callable(names):
+                return names(node)
+            else:
+                raise InvalidExpression('Trying to use name (variable) "{0}"'
+                                        ' when no "names" defined for'
+                                        ' evaluator'.format(name))
+        except KeyError:
+            if name in ev.functions:
+                return ev.functions[name]
+            raise NameNotDefined(name, ev.expr)
+    return run
+
+
+def _compile_unaryop(node):
+    operation = type(node.op)
+    operand = _compile(node.operand)
+    return lambda ev: ev.operators[operation](operand(ev))
+
+
+def _compile_binop(node):
+    operation = type(node.op)
+    left = _compile(node.left)
+    right = _compile(node.right)
+    return lambda ev: ev.operators[operation](left(ev), right(ev))
+
+
+def _compile_boolop(node):
+    values = [_compile(value) for value in node.values]
+    if isinstance(node.op, ast.And):
+        def run(ev):
+            vout = False
+            for value in values:
+                vout = value(ev)
+                if not vout:
+                    return vout
+            return vout
+    elif isinstance(node.op, ast.Or):
+        def run(ev):
+            for value in values:
+                vout = value(ev)
+                if vout:
+                    return vout
+            return vout
+    else:
+        def run(ev):
+            return None
+    return run
+
+
+def _compile_compare(node):
+    first = _compile(node.left)
+    comparisons = [(type(operation), _compile(comp))
+                   for operation, comp in zip(node.ops, node.comparators)]
+
+    def run(ev):
+        right = first(ev)
+        to_return = True
+        for operation, comp in comparisons:
+            if not to_return:
+                break
+            left = right
+            right = comp(ev)
+            to_return = ev.operators[operation](left, right)
+        return to_return
+    return run
+
+
+def _compile_ifexp(node):
+    test = _compile(node.test)
+    body = _compile(node.body)
+    orelse = _compile(node.orelse)
+    return lambda ev: body(ev) if test(ev) else orelse(ev)
+
+
+def _compile_call(node):
+    args = [_compile(a) for a in node.args]
+    keywords = [_compile(k) for k in node.keywords]
+    if isinstance(node.func, ast.Attribute):
+        attribute = _compile(node.func)
+
+        def lookup(ev):
+            return attribute(ev)
+    elif not hasattr(node.func, 'id'):
+        lookup = _compile_raise(FeatureNotAvailable('Lambda Functions not implemented'))
+    else:
+        name = node.func.id
+
+        def lookup(ev):
+            try:
+                func = ev.functions[name]
+            except KeyError:
+                raise FunctionNotDefined(name, ev.expr)
+            if func in DISALLOW_FUNCTIONS:
+                raise FeatureNotAvailable('This function is forbidden')
+            return func
+
+    def run(ev):
+        func = lookup(ev)
+        return func(
+            *(a(ev) for a in args),
+            **dict(k(ev) for k in keywords)
+        )
+    return run
+
+
+def _compile_keyword(node):
+    arg = node.arg
+    value = _compile(node.value)
+    return lambda ev: (arg, value(ev))
+
+
+def _compile_subscript(node):
+    value = _compile(node.value)
+    key = _compile(node.slice)
+    return lambda ev: value(ev)[key(ev)]
+
+
+def _compile_attribute(node):
+    attr = node.attr
+    for prefix in DISALLOW_PREFIXES:
+        if attr.startswith(prefix):
+            return _compile_raise(FeatureNotAvailable(
+                "Sorry, access to __attributes "
+                " or func_ attributes is not available. "
+                "({0})".format(attr)))
+    if attr in DISALLOW_METHODS:
+        return _compile_raise(FeatureNotAvailable(
+            "Sorry, this method is not available. "
+            "({0})".format(attr)))
+    value = _compile(node.value)
+
+    def run(ev):
+        node_evaluated = value(ev)
+        try:
+            return getattr(node_evaluated, attr)
+        except (AttributeError, TypeError):
+            pass
+        if ev.ATTR_INDEX_FALLBACK:
+            try:
+                return node_evaluated[attr]
+            except (KeyError, TypeError):
+                pass
+        raise AttributeDoesNotExist(attr, ev.expr)
+    return run
+
+
+def _compile_index(node):
+    return _compile(node.value)
+
+
+def _compile_slice(node):
+    none = lambda ev: None
+    lower = none if node.lower is None else _compile(node.lower)
+    upper = none if node.upper is None else _compile(node.upper)
+    step = none if node.step is None else _compile(node.step)
+    return lambda ev: slice(lower(ev), upper(ev), step(ev))
+
+
+_COMPILERS = {
+    ast.Expr: _compile_expr,
+    ast.Assign: _compile_assign,
+    ast.AugAssign: _compile_assign,
+    ast.Import: _compile_import,
+    ast.Name: _compile_name,
+    ast.UnaryOp: _compile_unaryop,
+    ast.BinOp: _compile_binop,
+    ast.BoolOp: _compile_boolop,
+    ast.Compare: _compile_compare,
+    ast.IfExp: _compile_ifexp,
+    ast.Call: _compile_call,
+    ast.keyword: _compile_keyword,
+    ast.Subscript: _compile_subscript,
+    ast.Attribute: _compile_attribute,
+    ast.Slice: _compile_slice,
+}
+
+# py3.8 parses literals to ast.Constant, older pythons to Num, Str
+# and NameConstant:
+if sys.version_info < (3, 8):
+    _COMPILERS[ast.Num] = _compile_num
+    _COMPILERS[ast.Str] = _compile_str
+    if hasattr(ast, 'NameConstant'):
+        _COMPILERS[ast.NameConstant] = _compile_constant
+if hasattr(ast, 'Constant'):
+    _COMPILERS[ast.Constant] = _compile_constant
+
+# py3.9 has no ast.Index around subscripts:
+if hasattr(ast, 'Index'):
+    _COMPILERS[ast.Index] = _compile_index
+
+
 def simple_eval(expr, operators=None, functions=None, names=None):
     """ Simply evaluate an expresssion """
     s = SimpleEval(operators=operators,